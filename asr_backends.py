@@ -0,0 +1,108 @@
+# asr_backends.py
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from model_registry import ESTIMATED_MODEL_MB, get_model_registry
+
+Segment = Dict[str, Any]
+
+
+class ASRBackend:
+    # 语音识别引擎接口：各实现的 transcribe 都返回 [{'start', 'end', 'text'}, ...]，
+    # 与 format_as_srt 使用的片段结构一致
+    name = ""
+    compute_types = ["default"]
+
+    def __init__(self, model_name: str, compute_type: str = "default", num_threads: int = 0):
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.num_threads = num_threads  # 0 表示由引擎自行决定
+
+    def spec(self) -> Dict[str, Any]:
+        # 可序列化的引擎描述，用于在工作进程中重建引擎以及构成缓存键
+        return {"name": self.name, "model_name": self.model_name,
+                "compute_type": self.compute_type, "num_threads": self.num_threads}
+
+    def registry_key(self) -> tuple:
+        # 线程数只影响推理，不影响权重，不同线程数共用同一份已加载的模型
+        return (self.name, self.model_name, self.compute_type)
+
+    def estimated_bytes(self) -> int:
+        return ESTIMATED_MODEL_MB.get(self.model_name, 0) * 1024 * 1024
+
+    def load(self) -> Any:
+        raise NotImplementedError
+
+    def model(self) -> Any:
+        return get_model_registry().get(self.registry_key(), self.load, self.estimated_bytes())
+
+    def warm_up(self) -> threading.Thread:
+        return get_model_registry().warm_up(self.registry_key(), self.load, self.estimated_bytes())
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                   initial_prompt: Optional[str] = None) -> List[Segment]:
+        raise NotImplementedError
+
+
+class WhisperBackend(ASRBackend):
+    # openai-whisper 参考实现
+    name = "openai-whisper"
+    compute_types = ["default"]
+
+    def load(self) -> Any:
+        import whisper
+        return whisper.load_model(self.model_name)
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                   initial_prompt: Optional[str] = None) -> List[Segment]:
+        import torch
+        import whisper
+        # 模型按引擎/型号共用，线程数在每次使用时设置；0 时恢复为全部核心，避免沿用上次的设置
+        torch.set_num_threads(self.num_threads or os.cpu_count() or 1)
+        options = whisper.DecodingOptions(language=language, task=task)
+        result = self.model().transcribe(audio, initial_prompt=initial_prompt, **options.__dict__)
+        return [{'start': s['start'], 'end': s['end'], 'text': s['text']} for s in result['segments']]
+
+
+class FasterWhisperBackend(ASRBackend):
+    # 基于 CTranslate2 的 faster-whisper，int8 量化后在纯 CPU 机器上明显更快、更省内存
+    name = "faster-whisper"
+    compute_types = ["int8", "int8_float32", "float32"]
+    MEMORY_FACTOR = {"int8": 0.3, "int8_float32": 0.3, "float32": 1.0}
+
+    def estimated_bytes(self) -> int:
+        return int(super().estimated_bytes() * self.MEMORY_FACTOR.get(self.compute_type, 1.0))
+
+    def load(self) -> Any:
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("faster-whisper 未安装，请先执行 pip install faster-whisper") from e
+        # CTranslate2 的线程池在加载时创建，之后无法调整；线程数不同时复用已加载的模型，
+        # 而不是再加载一份权重
+        return WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                            cpu_threads=self.num_threads)
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None, task: str = "transcribe",
+                   initial_prompt: Optional[str] = None) -> List[Segment]:
+        segments, _info = self.model().transcribe(np.ascontiguousarray(audio, dtype=np.float32),
+                                                  language=language, task=task,
+                                                  initial_prompt=initial_prompt)
+        # segments 是惰性生成器，遍历时才真正解码
+        return [{'start': s.start, 'end': s.end, 'text': s.text} for s in segments]
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+
+def create_backend(name: str, model_name: str, compute_type: str = "default", num_threads: int = 0) -> ASRBackend:
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"不支持的识别引擎: {name}")
+    if compute_type not in backend_class.compute_types:
+        compute_type = backend_class.compute_types[0]
+    return backend_class(model_name, compute_type, num_threads)
@@ -0,0 +1,85 @@
+# audio.py
+import subprocess
+import tempfile
+from typing import List
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper 要求的采样率
+BYTES_PER_SAMPLE = 4  # float32
+# 超过该时长的音频解码到内存映射的临时文件中，避免长讲座占满常驻内存
+MEMMAP_THRESHOLD_SECONDS = 60 * 60
+READ_CHUNK_BYTES = 1 << 20
+
+
+class AudioDecodeError(RuntimeError):
+    pass
+
+
+def probe_duration(media_path: str) -> float:
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+               "-of", "default=noprint_wrappers=1:nokey=1", media_path]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        return float(output.strip())
+    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
+        return 0.0
+
+
+def _allocate_buffer(num_samples: int) -> np.ndarray:
+    if num_samples > MEMMAP_THRESHOLD_SECONDS * SAMPLE_RATE:
+        # 临时文件创建后即被删除，映射关闭时空间自动回收
+        scratch = tempfile.TemporaryFile(prefix="vfp_audio_")
+        return np.memmap(scratch, dtype=np.float32, mode="w+", shape=(num_samples,))
+    return np.empty(num_samples, dtype=np.float32)
+
+
+def load_audio(media_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    # ffmpeg 直接输出 16kHz 单声道 float32 PCM 到管道，一次解码，不落地临时音频文件
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+               "-i", media_path, "-vn", "-map", "0:a:0",
+               "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "-"]
+
+    duration = probe_duration(media_path)
+    # 时长未知时先按 10 分钟分配，超出部分走溢出缓冲
+    capacity = int(duration * sample_rate) + sample_rate if duration > 0 else sample_rate * 600
+    buffer = _allocate_buffer(capacity)
+    raw = buffer.view(np.uint8)
+
+    # 日志写入临时文件而不是管道：音轨损坏时日志可能超过管道缓冲区，
+    # 只读 stdout 时 ffmpeg 会阻塞在写 stderr 上，两边互相等待
+    log_file = tempfile.TemporaryFile(prefix="vfp_ffmpeg_")
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=log_file)
+    except FileNotFoundError as e:
+        log_file.close()
+        raise AudioDecodeError(f"ffmpeg not found: {e}")
+
+    filled = 0
+    overflow: List[bytes] = []
+    while True:
+        if filled < raw.nbytes:
+            n = process.stdout.readinto(memoryview(raw[filled:]))
+            if not n:
+                break
+            filled += n
+        else:
+            chunk = process.stdout.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            overflow.append(chunk)
+
+    returncode = process.wait()
+    with log_file:
+        log_file.seek(0)
+        stderr = log_file.read().decode("utf-8", errors="replace")
+    if returncode != 0:
+        raise AudioDecodeError(f"Error extracting audio: {stderr.strip()}")
+
+    audio = buffer[:filled // BYTES_PER_SAMPLE]
+    if overflow:
+        extra = np.frombuffer(b"".join(overflow), dtype=np.float32)
+        audio = np.concatenate([audio, extra])
+    if audio.size == 0:
+        raise AudioDecodeError(f"No audio stream decoded from {media_path}")
+    return audio
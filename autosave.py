@@ -0,0 +1,317 @@
+# autosave.py
+# 编辑框自动保存：把 contentsChange 描述的编辑操作追加写入日志，定期压缩为快照(.vfp 项目文件)。
+# 崩溃后加载最新快照并重放日志即可恢复，每次自动保存的开销只与编辑量有关，与文档大小无关
+import glob
+import json
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+from typing import IO, Any, Dict, List, Optional, Union
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtGui import QTextCursor, QTextDocument, QTextImageFormat
+from PyQt5.QtWidgets import QTextEdit
+
+from disk_cache import cache_root
+from image_store import IMAGE_SCHEME, ImageStore
+from project import Project, ProjectError, load_project, save_project
+
+FLUSH_INTERVAL_MS = 3000
+COMPACT_OPS = 2000  # 日志累积多少条操作后压缩为快照
+LARGE_EDIT_CHARS = 20000  # 超过该长度的编辑(如整体加载字幕)直接生成快照，不写日志
+
+GENERATION_RE = re.compile(r"(\d+)\.")
+
+# 插入内容：文本片段或图片 {"image": 名称, "width": 宽, "height": 高}
+Piece = Union[str, Dict[str, Any]]
+
+
+def autosave_dir() -> str:
+    # 各程序实例在其中各自使用一个 session-* 子目录
+    path = os.path.join(cache_root(), "autosave")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _lock_session(path: str) -> Optional[IO]:
+    # 非阻塞地锁定会话目录中的锁文件，进程退出(包括崩溃)时由系统释放；已被其他实例持有时返回 None
+    try:
+        lock_file = open(os.path.join(path, "lock"), "a+")
+    except OSError:
+        return None
+    try:
+        lock_file.seek(0)
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _generation(path: str) -> int:
+    match = GENERATION_RE.search(os.path.basename(path))
+    return int(match.group(1)) if match else -1
+
+
+def _utf16_slice(text: str, start: int, end: int) -> str:
+    # 文档位置以 UTF-16 编码单元计，BMP 以外的字符(如 emoji)占两个位置
+    return text.encode("utf-16-le")[start * 2:end * 2].decode("utf-16-le", errors="surrogatepass")
+
+
+def capture_range(document: QTextDocument, start: int, end: int) -> List[Piece]:
+    # 按文本片段读取 [start, end) 的内容，开销与编辑范围成正比
+    pieces: List[Piece] = []
+    block = document.findBlock(start)
+    while block.isValid() and block.position() < end:
+        iterator = block.begin()
+        while not iterator.atEnd():
+            fragment = iterator.fragment()
+            iterator += 1
+            frag_start, frag_end = fragment.position(), fragment.position() + fragment.length()
+            if frag_end <= start or frag_start >= end:
+                continue
+            char_format = fragment.charFormat()
+            first, last = max(start, frag_start) - frag_start, min(end, frag_end) - frag_start
+            if char_format.isImageFormat():
+                # 相邻的同一图片会合并为一个片段，每个位置各是一张图片
+                image_format = char_format.toImageFormat()
+                piece = {"image": image_format.name(), "width": image_format.width(),
+                         "height": image_format.height()}
+                pieces.extend(dict(piece) for _ in range(last - first))
+            else:
+                pieces.append(_utf16_slice(fragment.text(), first, last))
+        separator = block.position() + block.length() - 1  # 块末尾的段落分隔符
+        if start <= separator < end and block.next().isValid():
+            pieces.append("\n")
+        block = block.next()
+    return pieces
+
+
+def replay(document: QTextDocument, operations: List[Dict[str, Any]]) -> None:
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    for operation in operations:
+        last = document.characterCount() - 1
+        position = min(operation["p"], last)
+        cursor.setPosition(position)
+        cursor.setPosition(min(position + operation["r"], last), QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        for piece in operation["i"]:
+            if isinstance(piece, str):
+                cursor.insertText(piece)
+            else:
+                image_format = QTextImageFormat()
+                image_format.setName(piece["image"])
+                image_format.setWidth(piece["width"])
+                image_format.setHeight(piece["height"])
+                cursor.insertImage(image_format)
+    cursor.endEditBlock()
+
+
+class AutosaveJournal(QObject):
+    # 界面线程只记录编辑操作，写盘、编码图片和生成快照都在后台线程完成。
+    # 文件按代号命名: snapshot-<n>.vfp 为快照，journal-<n>.jsonl 为快照之后的操作
+    def __init__(self, editor: QTextEdit, image_store: ImageStore, directory: Optional[str] = None):
+        super().__init__(editor)
+        self.editor = editor
+        self.document = editor.document()
+        self.image_store = image_store
+        self.lock_file: Optional[IO] = None
+        self.directory = directory or self._claim_session()
+        os.makedirs(os.path.join(self.directory, "images"), exist_ok=True)
+        self.generation = max((_generation(p) for p in self._files("*")), default=-1)
+        self.pending: List[Dict[str, Any]] = []
+        self.ops_since_snapshot = 0
+        self.running = False
+
+        self.queue: "queue.Queue" = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def _claim_session(self) -> str:
+        # 运行期间一直持有会话目录的锁；能取得锁的目录属于已退出的实例，
+        # 其中留有日志时接管用于恢复，没有时删除
+        root = autosave_dir()
+        sessions = glob.glob(os.path.join(root, "session-*"))
+        for path in sorted(sessions, key=os.path.getmtime, reverse=True):
+            lock_file = _lock_session(path)
+            if lock_file is None:
+                continue  # 其他实例正在使用
+            if glob.glob(os.path.join(path, "*-*.*")):
+                self.lock_file = lock_file
+                return path
+            lock_file.close()
+            shutil.rmtree(path, ignore_errors=True)
+        path = tempfile.mkdtemp(prefix="session-", dir=root)
+        self.lock_file = _lock_session(path)
+        return path
+
+    def _files(self, pattern: str) -> List[str]:
+        return glob.glob(os.path.join(self.directory, f"{pattern}-*.*"))
+
+    def _path(self, kind: str, generation: int) -> str:
+        suffix = "vfp" if kind == "snapshot" else "jsonl"
+        return os.path.join(self.directory, f"{kind}-{generation}.{suffix}")
+
+    def _image_path(self, name: str) -> str:
+        return os.path.join(self.directory, "images", name[len(IMAGE_SCHEME) + 1:] + ".png")
+
+    # ---- 恢复 ----
+
+    def has_recovery(self) -> bool:
+        # 上次未正常退出且留下了内容：日志非空，或快照中有文本或图片
+        if any(os.path.getsize(p) > 0 for p in self._files("journal")):
+            return True
+        for path in self._files("snapshot"):
+            try:
+                html = load_project(path, ImageStore()).html
+            except ProjectError:
+                continue
+            document = QTextDocument()
+            document.setHtml(html)
+            if document.toPlainText().strip():
+                return True
+        return False
+
+    def recover(self) -> bool:
+        snapshots = sorted(self._files("snapshot"), key=_generation)
+        generation = _generation(snapshots[-1]) if snapshots else 0
+        html = ""
+        if snapshots:
+            try:
+                html = load_project(snapshots[-1], self.image_store).html
+            except ProjectError as e:
+                print(f"Error loading autosave snapshot: {e}")
+                return False
+        # 快照之后插入的图片保存在 images 目录中
+        self.image_store.add_loader(self._read_image)
+
+        operations = []
+        try:
+            with open(self._path("journal", generation), "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        operations.append(json.loads(line))
+                    except ValueError:
+                        break  # 崩溃时写了一半的行
+        except FileNotFoundError:
+            pass
+
+        self.editor.setHtml(html)
+        replay(self.document, operations)
+        return True
+
+    def _read_image(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._image_path(name), "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def discard(self) -> None:
+        # 只删除本实例的会话目录，其他正在运行的实例不受影响
+        images = glob.glob(os.path.join(self.directory, "images", "*.png"))
+        for path in self._files("snapshot") + self._files("journal") + images:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    # ---- 记录 ----
+
+    def start(self) -> None:
+        # 以当前文档内容生成初始快照后开始记录
+        self.running = True
+        self.document.contentsChange.connect(self.on_contents_change)
+        self.compact()
+        self.flush_timer.start(FLUSH_INTERVAL_MS)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self.flush_timer.stop()
+        self.document.contentsChange.disconnect(self.on_contents_change)
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+
+    def on_contents_change(self, position: int, chars_removed: int, chars_added: int) -> None:
+        if chars_added > LARGE_EDIT_CHARS:
+            # 整体替换文档时日志没有意义，稍后直接生成快照
+            self.pending.clear()
+            self.ops_since_snapshot = COMPACT_OPS
+            return
+        end = min(position + chars_added, self.document.characterCount() - 1)
+        pieces = capture_range(self.document, position, end)
+        self.pending.append({"p": position, "r": chars_removed, "i": pieces})
+
+    def flush(self) -> None:
+        if self.ops_since_snapshot + len(self.pending) >= COMPACT_OPS:
+            self.compact()
+            return
+        if not self.pending:
+            return
+        operations, self.pending = self.pending, []
+        self.ops_since_snapshot += len(operations)
+        self.queue.put(("append", self.generation, operations))
+
+    def compact(self) -> None:
+        # toHtml 需要在界面线程执行，其余工作交给后台线程
+        self.pending.clear()
+        self.ops_since_snapshot = 0
+        self.generation += 1
+        self.queue.put(("snapshot", self.generation, self.editor.toHtml()))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                kind, generation, payload = item
+                if kind == "append":
+                    self._append(generation, payload)
+                else:
+                    self._snapshot(generation, payload)
+            except Exception as e:
+                # 写入线程不能因单次失败退出，否则之后的编辑都不再保存
+                print(f"Error writing autosave: {e}")
+
+    def _append(self, generation: int, operations: List[Dict[str, Any]]) -> None:
+        for operation in operations:
+            for piece in operation["i"]:
+                if isinstance(piece, dict):
+                    image_path = self._image_path(piece["image"])
+                    data = self.image_store.png_bytes(piece["image"])
+                    if data is not None and not os.path.exists(image_path):
+                        with open(image_path, "wb") as file:
+                            file.write(data)
+        with open(self._path("journal", generation), "a", encoding="utf-8") as file:
+            for operation in operations:
+                file.write(json.dumps(operation, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _snapshot(self, generation: int, html: str) -> None:
+        # 先建好新日志再写快照，最后删除旧文件；任何一步崩溃都能找到一致的快照和日志
+        open(self._path("journal", generation), "w").close()
+        save_project(self._path("snapshot", generation), Project(html), self.image_store)
+        for path in self._files("snapshot") + self._files("journal"):
+            if _generation(path) < generation:
+                os.remove(path)
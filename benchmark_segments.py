@@ -0,0 +1,92 @@
+# benchmark_segments.py
+# 对比书面化前的分段提取：旧方法(toHtml + BeautifulSoup，图片内嵌 base64) 与 直接遍历文档块和片段。
+# 用法: python benchmark_segments.py --hours 3
+import argparse
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from PyQt5.QtGui import QColor, QImage, QPainter
+from PyQt5.QtWidgets import QApplication
+
+from cues import CueList
+from rich_text_editor import RichTextEditor
+
+CUE_SECONDS = 3
+SLIDE_INTERVAL_SECONDS = 300
+
+
+def legacy_extract(html_content):
+    # 旧实现，保留用于对比
+    soup = BeautifulSoup(html_content, 'html.parser')
+    segments = []
+    current_text = ''
+    for p_element in soup.find_all('p'):
+        for span in p_element.find_all('span'):
+            current_text += span.get_text() + '\n'
+        for img in p_element.find_all('img'):
+            if current_text:
+                segments.append({'type': 'text', 'content': current_text.strip()})
+                current_text = ''
+            segments.append({'type': 'image', 'content': f"<p>{str(img)}</p>"})
+    if current_text:
+        segments.append({'type': 'text', 'content': current_text.strip()})
+    return segments
+
+
+def make_slide(index):
+    image = QImage(1280, 720, QImage.Format_RGB32)
+    image.fill(QColor("white"))
+    painter = QPainter(image)
+    for y in range(40, 720, 40):
+        painter.drawText(40, y, f"第 {index} 页 示例幻灯片内容 " * 6)
+    painter.end()
+    return image
+
+
+def build_document(editor, hours):
+    cues = CueList()
+    total = int(hours * 3600 / CUE_SECONDS)
+    for i in range(total):
+        cues.append(i * CUE_SECONDS * 1000, (i + 1) * CUE_SECONDS * 1000 - 200,
+                    f"这是第 {i} 条字幕，用于测试长时间讲座转写文本的分段提取速度")
+    editor.setPlainText(cues.to_srt())
+    # 每隔几分钟插入一页幻灯片
+    cursor = editor.textCursor()
+    per_slide = SLIDE_INTERVAL_SECONDS // CUE_SECONDS
+    for n, block_number in enumerate(range(per_slide * 4, total * 4, per_slide * 4)):
+        cursor.setPosition(editor.document().findBlockByNumber(block_number).position())
+        editor.setTextCursor(cursor)
+        editor.insert_image(make_slide(n))
+    return total
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=3)
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    editor = RichTextEditor()
+    cue_count = build_document(editor, args.hours)
+    inline_html = editor.image_store.inline_html(editor.toHtml())  # 旧版文档中图片以 base64 内嵌
+
+    legacy_time, legacy = timed(lambda: legacy_extract(inline_html))
+    legacy_total, _ = timed(lambda: legacy_extract(editor.image_store.inline_html(editor.toHtml())))
+    new_time, segments = timed(editor.extract_text_and_images)
+
+    print(f"{args.hours} 小时, {cue_count} 条字幕, {len(editor.image_store)} 页幻灯片")
+    print(f"旧方法 (toHtml + BeautifulSoup): {legacy_total:.3f}s (仅解析 {legacy_time:.3f}s), {len(legacy)} 段")
+    print(f"新方法 (遍历文档块):             {new_time:.3f}s, {len(segments)} 段")
+    print(f"加速比: {legacy_total / new_time:.1f}x")
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
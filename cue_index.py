@@ -0,0 +1,116 @@
+# cue_index.py
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+from PyQt5.QtGui import QTextDocument
+
+from cues import parse_time_range
+
+
+def parse_cue_line(text: str) -> Optional[Tuple[int, int]]:
+    # 解析 "00:00:01,000 --> 00:00:02,000" 形式的时间行，返回毫秒
+    if '-->' not in text:
+        return None
+    return parse_time_range(text)
+
+
+class CueIndex:
+    # 编辑框中字幕时间行的区间索引。按文档顺序保存时间行所在块号及起止时间，
+    # 随文档的 contentsChange 增量更新，播放时按时间二分查找，无需序列化整个文档
+    def __init__(self, document: QTextDocument):
+        self.document = document
+        self.blocks = array('q')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.block_count = 0
+        # 按开始时间排序的视图，时间行有增删改时才重建
+        self._order: Optional[List[int]] = None
+        self._sorted_starts = array('q')
+        self._max_ends = array('q')  # 排序后前缀最大结束时间，用于处理相互重叠的字幕
+        document.documentLayout()  # 文档没有布局时不会发出 contentsChange
+        document.contentsChange.connect(self.on_contents_change)
+        self.rebuild()
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def _parse_blocks(self, first: int, last: int) -> Tuple[array, array, array]:
+        blocks, starts, ends = array('q'), array('q'), array('q')
+        block = self.document.findBlockByNumber(first)
+        while block.isValid() and block.blockNumber() <= last:
+            cue = parse_cue_line(block.text())
+            if cue is not None:
+                blocks.append(block.blockNumber())
+                starts.append(cue[0])
+                ends.append(cue[1])
+            block = block.next()
+        return blocks, starts, ends
+
+    def rebuild(self) -> None:
+        self.block_count = self.document.blockCount()
+        self.blocks, self.starts, self.ends = self._parse_blocks(0, self.block_count - 1)
+        self._order = None
+
+    def on_contents_change(self, position: int, chars_removed: int, chars_added: int) -> None:
+        document = self.document
+        delta = document.blockCount() - self.block_count
+        self.block_count = document.blockCount()
+
+        first = document.findBlock(position).blockNumber()
+        last_block = document.findBlock(position + chars_added)
+        last = last_block.blockNumber() if last_block.isValid() else self.block_count - 1
+        if first < 0:
+            self.rebuild()
+            return
+
+        # 变更前受影响的块为 [first, last - delta]，之后的块号整体平移 delta
+        lo = bisect_left(self.blocks, first)
+        hi = bisect_right(self.blocks, last - delta)
+        blocks, starts, ends = self._parse_blocks(first, last)
+
+        if self.starts[lo:hi] != starts or self.ends[lo:hi] != ends:
+            self._order = None
+        tail = self.blocks[hi:]
+        if delta:
+            tail = array('q', (block + delta for block in tail))
+        self.blocks = self.blocks[:lo] + blocks + tail
+        self.starts = self.starts[:lo] + starts + self.starts[hi:]
+        self.ends = self.ends[:lo] + ends + self.ends[hi:]
+
+    def cue_at_block(self, block_number: int) -> Optional[Tuple[int, int]]:
+        # 块号 -> (开始, 结束) 毫秒，该块不是时间行时返回 None
+        i = bisect_left(self.blocks, block_number)
+        if i < len(self.blocks) and self.blocks[i] == block_number:
+            return self.starts[i], self.ends[i]
+        return None
+
+    def _ensure_sorted(self) -> None:
+        if self._order is not None:
+            return
+        # 字幕通常已按时间排列，Timsort 在有序输入上为线性时间
+        order = sorted(range(len(self.starts)), key=self.starts.__getitem__)
+        self._sorted_starts = array('q', (self.starts[i] for i in order))
+        self._max_ends = array('q')
+        current = -1
+        for i in order:
+            current = max(current, self.ends[i])
+            self._max_ends.append(current)
+        self._order = order
+
+    def find_next(self, time_ms: int) -> int:
+        # 返回开始时间不早于该时间的第一条字幕的时间行块号，没有时返回 -1
+        self._ensure_sorted()
+        i = bisect_left(self._sorted_starts, time_ms)
+        return self.blocks[self._order[i]] if i < len(self._order) else -1
+
+    def find(self, time_ms: int) -> int:
+        # 返回包含该时间的字幕时间行块号，没有时返回 -1
+        self._ensure_sorted()
+        i = bisect_right(self._sorted_starts, time_ms) - 1
+        while i >= 0 and self._max_ends[i] >= time_ms:
+            cue = self._order[i]
+            if self.ends[cue] >= time_ms:
+                return self.blocks[cue]
+            i -= 1
+        return -1
@@ -0,0 +1,146 @@
+# cues.py
+# 字幕数据模型：列式存储字幕条目，负责 SRT/VTT 的解析与序列化，供转写、编辑框索引和书面化共用
+import re
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+TIME_RANGE_RE = re.compile(
+    r'\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{3})\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{3})')
+
+# (编号, 开始毫秒, 结束毫秒, 文本)
+Cue = Tuple[int, int, int, str]
+
+
+def seconds_to_ms(seconds: float) -> int:
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(ms: int, separator: str = ",") -> str:
+    s, ms = divmod(ms, 1000)
+    h, s = divmod(s, 3600)
+    m, s = divmod(s, 60)
+    return f"{h:02}:{m:02}:{s:02}{separator}{ms:03}"
+
+
+def parse_time_range(line: str) -> Optional[Tuple[int, int]]:
+    # 解析 "00:00:01,000 --> 00:00:02,000"，兼容 VTT 的 "." 分隔、省略小时以及行尾的样式设置
+    match = TIME_RANGE_RE.match(line)
+    if match is None:
+        return None
+    h1, m1, s1, ms1, h2, m2, s2, ms2 = match.groups()
+    start = ((int(h1 or 0) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(ms1)
+    end = ((int(h2 or 0) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(ms2)
+    return start, end
+
+
+def _parse_block(block: List[str]) -> Optional[Cue]:
+    for i, line in enumerate(block):
+        times = parse_time_range(line)
+        if times is not None:
+            identifier = block[i - 1].strip() if i else ""
+            cue_id = int(identifier) if identifier.isdigit() else 0
+            return cue_id, times[0], times[1], "\n".join(block[i + 1:])
+    return None  # VTT 的 WEBVTT 头、NOTE、STYLE 等块
+
+
+def iter_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    # 流式解析 SRT/VTT，可以直接传入文件对象，逐条产出而不把整个文件读入内存
+    block: List[str] = []
+    for raw_line in lines:
+        line = raw_line.rstrip("\r\n")
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            cue = _parse_block(block)
+            if cue is not None:
+                yield cue
+            block = []
+    if block:
+        cue = _parse_block(block)
+        if cue is not None:
+            yield cue
+
+
+def iter_file(path: str) -> Iterator[Cue]:
+    with open(path, "r", encoding="utf-8-sig") as file:
+        yield from iter_cues(file)
+
+
+def strip_cue_markup(text: str) -> str:
+    # 去掉编号行和时间行，只保留字幕文本；非字幕内容(用户插入的段落等)原样保留
+    lines = text.split("\n")
+    kept: List[str] = []
+    for i, line in enumerate(lines):
+        if parse_time_range(line) is not None:
+            if kept and kept[-1].strip().isdigit():
+                kept.pop()
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+class CueList:
+    # 开始/结束时间(毫秒)和编号保存在 array 中，文本保存在列表中
+    __slots__ = ("ids", "starts", "ends", "texts")
+
+    def __init__(self):
+        self.ids = array('q')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.texts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Cue]:
+        return zip(self.ids, self.starts, self.ends, self.texts)
+
+    def __getitem__(self, index: int) -> Cue:
+        return self.ids[index], self.starts[index], self.ends[index], self.texts[index]
+
+    def append(self, start_ms: int, end_ms: int, text: str, cue_id: int = 0) -> None:
+        self.ids.append(cue_id or len(self.texts) + 1)
+        self.starts.append(start_ms)
+        self.ends.append(end_ms)
+        self.texts.append(text)
+
+    def extend(self, cues: Iterable[Cue]) -> None:
+        for cue_id, start_ms, end_ms, text in cues:
+            self.append(start_ms, end_ms, text, cue_id)
+
+    @classmethod
+    def from_cues(cls, cues: Iterable[Cue]) -> "CueList":
+        cue_list = cls()
+        cue_list.extend(cues)
+        return cue_list
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Dict[str, Any]], start_index: int = 1) -> "CueList":
+        # 由识别引擎输出的片段(时间单位为秒)构建
+        cue_list = cls()
+        for i, segment in enumerate(segments, start_index):
+            cue_list.append(seconds_to_ms(segment['start']), seconds_to_ms(segment['end']), segment['text'], i)
+        return cue_list
+
+    @classmethod
+    def parse(cls, text: str) -> "CueList":
+        return cls.from_cues(iter_cues(text.splitlines()))
+
+    @classmethod
+    def read(cls, path: str) -> "CueList":
+        return cls.from_cues(iter_file(path))
+
+    def to_srt(self) -> str:
+        return "".join(f"{cue_id}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+                       for cue_id, start, end, text in self)
+
+    def to_vtt(self) -> str:
+        cues = "".join(f"{cue_id}\n{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n\n"
+                       for cue_id, start, end, text in self)
+        return "WEBVTT\n\n" + cues
+
+    def write(self, path: str) -> None:
+        content = self.to_vtt() if path.lower().endswith(".vtt") else self.to_srt()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
@@ -0,0 +1,89 @@
+# disk_cache.py
+import os
+import tempfile
+from typing import Optional
+
+
+def cache_root() -> str:
+    root = os.getenv("VFP_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "vfp")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def file_identity(path: str) -> str:
+    # 路径/大小/修改时间，文件未变化时相同，用于记住按文件内容计算出的哈希
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class DiskLRUCache:
+    # 以文件为单位的磁盘缓存：命中时更新修改时间，超出容量时删除最久未使用的文件
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get_path(self, name: str) -> Optional[str]:
+        path = self.path_for(name)
+        try:
+            os.utime(path)  # 标记为最近使用
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_bytes(self, name: str) -> Optional[bytes]:
+        path = self.get_path(name)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put_bytes(self, name: str, data: bytes, cleanup: bool = True) -> str:
+        path = self.path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读取到半截内容
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+        if cleanup:
+            self.cleanup()
+        return path
+
+    def remove(self, name: str) -> None:
+        try:
+            os.remove(self.path_for(name))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self) -> None:
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,167 @@
+# image_store.py
+# 编辑框图片存储：按内容哈希保存图片，文档中只保留短引用，只有导出到外部格式时才生成 base64
+import base64
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QUrl
+from PyQt5.QtGui import QImage, QTextDocument
+
+IMAGE_SCHEME = "vfp-image"
+IMAGE_REF_RE = re.compile(r'src="(%s:[0-9a-f]+)"' % IMAGE_SCHEME)
+DATA_URI_RE = re.compile(r'src="data:image/(?:png|jpeg|jpg|gif|bmp);base64,([A-Za-z0-9+/=\s]+)"')
+
+
+def encode_png(image: QImage) -> bytes:
+    byte_array = QByteArray()
+    buffer = QBuffer(byte_array)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(byte_array)
+
+
+def image_html(name: str, width: float = 0, height: float = 0) -> str:
+    size = f' width="{int(width)}" height="{int(height)}"' if width and height else ""
+    return f'<p><img src="{name}"{size}/></p>'
+
+
+def referenced_images(html: str) -> Iterable[str]:
+    return IMAGE_REF_RE.findall(html)
+
+
+class ImageStore:
+    # 自动保存的写入线程也会读取图片，字典的读写都在锁内进行；编码和读取文件在锁外完成，不阻塞界面线程
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images: Dict[str, QImage] = {}
+        self._png: Dict[str, bytes] = {}  # 首次导出时才编码 PNG
+        # 打开项目文件时按需读取图片数据，未显示过的图片不会被解码
+        self._loader: Optional[Callable[[str], Optional[bytes]]] = None
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._images
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._images)
+
+    def names(self):
+        with self._lock:
+            return list(self._images)
+
+    def add_image(self, image: QImage) -> str:
+        # 以像素数据的哈希作为键，同一页幻灯片插入多次只保存一份
+        image = image.convertToFormat(QImage.Format_ARGB32)
+        pixels = image.constBits().asstring(image.sizeInBytes())
+        digest = hashlib.sha256(f"{image.width()}x{image.height()}".encode("ascii") + pixels).hexdigest()
+        name = f"{IMAGE_SCHEME}:{digest}"
+        with self._lock:
+            self._images.setdefault(name, image)
+        return name
+
+    def add_encoded(self, data: bytes) -> Optional[str]:
+        image = QImage.fromData(data)
+        if image.isNull():
+            return None
+        name = self.add_image(image)
+        with self._lock:
+            self._png.setdefault(name, data)
+        return name
+
+    def set_loader(self, loader: Optional[Callable[[str], Optional[bytes]]]) -> None:
+        self._loader = loader
+
+    def add_loader(self, loader: Callable[[str], Optional[bytes]]) -> None:
+        # 在已有加载器之后追加一个来源
+        previous = self._loader
+        if previous is None:
+            self._loader = loader
+            return
+        self._loader = lambda name: previous(name) or loader(name)
+
+    def image(self, name: str) -> Optional[QImage]:
+        with self._lock:
+            image = self._images.get(name)
+        if image is None and self._loader is not None:
+            data = self.png_bytes(name)
+            if data is not None:
+                image = QImage.fromData(data)
+                if image.isNull():
+                    return None
+                with self._lock:
+                    image = self._images.setdefault(name, image)
+        return image
+
+    def png_bytes(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._png.get(name)
+            image = self._images.get(name)
+            loader = self._loader
+        if data is not None:
+            return data
+        if image is not None:
+            data = encode_png(image)
+        elif loader is not None:
+            data = loader(name)
+            if data is None:
+                return None
+        else:
+            return None
+        with self._lock:
+            return self._png.setdefault(name, data)
+
+    def encode_all(self, names: Iterable[str]) -> None:
+        # 保存项目前并行编码尚未编码过的图片，QImage.save 执行时会释放 GIL
+        with self._lock:
+            pending: List[str] = [name for name in names if name not in self._png and name in self._images]
+            images = [self._images[name] for name in pending]
+        if len(pending) < 2:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1)) as executor:
+            encoded = list(executor.map(encode_png, images))
+        with self._lock:
+            for name, data in zip(pending, encoded):
+                self._png.setdefault(name, data)
+
+    def data_uri(self, name: str) -> Optional[str]:
+        data = self.png_bytes(name)
+        if data is None:
+            return None
+        return "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+    def register(self, document: QTextDocument, html: str) -> None:
+        # 把 HTML 引用到的图片注册为文档资源，供没有重写 loadResource 的编辑框使用
+        for name in set(referenced_images(html)):
+            image = self.image(name)
+            if image is not None:
+                document.addResource(QTextDocument.ImageResource, QUrl(name), image)
+
+    def inline_html(self, html: str) -> str:
+        # 导出到外部(HTML 文件、剪贴板)时把引用替换为 base64 数据
+        def replace(match):
+            uri = self.data_uri(match.group(1))
+            return f'src="{uri}"' if uri else match.group(0)
+        return IMAGE_REF_RE.sub(replace, html)
+
+    def absorb_html(self, html: str) -> str:
+        # 读取旧版内嵌 base64 图片的 HTML 时收入存储，文档中改为短引用
+        def replace(match):
+            try:
+                name = self.add_encoded(base64.b64decode(match.group(1)))
+            except ValueError:
+                name = None
+            return f'src="{name}"' if name else match.group(0)
+        return DATA_URI_RE.sub(replace, html)
+
+    def image_bytes(self, src: str) -> Optional[bytes]:
+        # 按 img 的 src 取图片数据，兼容旧的 data URI
+        if src.startswith(IMAGE_SCHEME + ":"):
+            return self.png_bytes(src)
+        if src.startswith("data:image/"):
+            return base64.b64decode(src.split(",", 1)[1])
+        return None
@@ -0,0 +1,330 @@
+# job_server.py
+# 本地批处理服务：持久化任务队列 + 多个工作进程，批量完成 视频 -> 字幕 -> 书面化文档。
+# 用法:
+#   python job_server.py serve --workers 2 --threads 4 --max-memory-mb 8000
+#   python job_server.py submit a.mp4 b.mp4 --model small --optimize --api-provider OpenAI
+#   python job_server.py list
+#   python job_server.py cancel 3
+# --max-memory-mb 按工作进程的常驻内存(RSS)检查：服务每隔几秒读取一次，超出时结束该进程并把任务标记为失败。
+# 不使用 RLIMIT_AS，因为 torch、CTranslate2 和 OpenBLAS 预留的虚拟地址空间远大于实际占用
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from cues import CueList
+from disk_cache import cache_root
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+HEARTBEAT_SECONDS = 2
+POLL_SECONDS = 1
+CUES_PER_OPTIMIZE_SEGMENT = 40  # 书面化时每段送给大模型的字幕条数
+
+
+def default_db_path() -> str:
+    return os.getenv("VFP_JOB_DB") or os.path.join(cache_root(), "jobs.db")
+
+
+def job_output_dir(job_id: int) -> str:
+    path = os.path.join(cache_root(), "jobs", str(job_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class JobQueue:
+    # 基于 SQLite 的任务队列，界面、命令行和各工作进程各自打开连接共享同一个数据库
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or default_db_path()
+        self.connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_path TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                srt_path TEXT NOT NULL DEFAULT '',
+                document_path TEXT NOT NULL DEFAULT '',
+                worker_pid INTEGER,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS server (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                pid INTEGER NOT NULL,
+                heartbeat REAL NOT NULL
+            )""")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def submit(self, video_path: str, options: Dict[str, Any]) -> int:
+        now = time.time()
+        cursor = self.connection.execute(
+            "INSERT INTO jobs (video_path, options, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(video_path), json.dumps(options), QUEUED, now, now))
+        return cursor.lastrowid
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        # BEGIN IMMEDIATE 取得写锁，保证同一任务只会被一个工作进程领取
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, worker_pid = ?, message = '', updated_at = ? WHERE id = ?",
+                    (RUNNING, os.getpid(), time.time(), row["id"]))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return row
+
+    def update(self, job_id: int, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def finish(self, job_id: int, status: str, **fields: Any) -> bool:
+        # 只有仍在运行的任务才会改为完成/失败，不覆盖期间写入的取消状态
+        fields["status"] = status
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        cursor = self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND status = ?",
+                                         (*fields.values(), job_id, RUNNING))
+        return cursor.rowcount > 0
+
+    def fail_worker_jobs(self, worker_pid: int, message: str) -> None:
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, message = ?, updated_at = ? WHERE status = ? AND worker_pid = ?",
+            (FAILED, message, time.time(), RUNNING, worker_pid))
+
+    def status(self, job_id: int) -> Optional[str]:
+        row = self.connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def get(self, job_id: int) -> Optional[sqlite3.Row]:
+        return self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def list_jobs(self, limit: int = 200) -> List[sqlite3.Row]:
+        return self.connection.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def cancel(self, job_id: int) -> None:
+        # 运行中的任务由工作进程在分块之间检测到后停止
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, QUEUED, RUNNING))
+
+    def retry(self, job_id: int) -> None:
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, progress = 0, message = '', updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (QUEUED, time.time(), job_id, FAILED, CANCELLED))
+
+    def requeue_interrupted(self) -> None:
+        # 服务异常退出时遗留的运行中任务重新排队，借助转写断点从中断处继续
+        self.connection.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                                (QUEUED, time.time(), RUNNING))
+
+    def heartbeat(self) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO server (id, pid, heartbeat) VALUES (1, ?, ?)",
+                                (os.getpid(), time.time()))
+
+    def server_alive(self) -> bool:
+        row = self.connection.execute("SELECT heartbeat FROM server WHERE id = 1").fetchone()
+        return row is not None and time.time() - row["heartbeat"] < HEARTBEAT_SECONDS * 3
+
+
+def srt_to_optimize_segments(srt_path: str) -> List[Dict[str, str]]:
+    # 按固定条数把字幕文本切成多段，避免整场讲座一次性送给大模型
+    texts = CueList.read(srt_path).texts
+    return [{'type': 'text', 'content': "\n".join(texts[i:i + CUES_PER_OPTIMIZE_SEGMENT])}
+            for i in range(0, len(texts), CUES_PER_OPTIMIZE_SEGMENT)]
+
+
+def process_job(queue: JobQueue, job: sqlite3.Row, num_threads: int) -> None:
+    from subtitles import SubtitlePipeline
+
+    job_id = job["id"]
+    options = json.loads(job["options"])
+    last_progress = [-1]
+
+    def on_progress(progress: int) -> None:
+        # 字幕占总进度的 80%，书面化占剩余部分
+        progress = progress * 8 // 10 if options.get("optimize") else progress
+        if progress != last_progress[0]:
+            last_progress[0] = progress
+            queue.update(job_id, progress=progress)
+
+    def should_stop() -> bool:
+        return queue.status(job_id) == CANCELLED
+
+    # 服务本身已经按任务并行，单个任务内部不再启动进程池
+    pipeline = SubtitlePipeline(job["video_path"], options.get("model", "small"), 1,
+                                options.get("backend", "openai-whisper"),
+                                options.get("compute_type", "default"),
+                                options.get("num_threads") or num_threads,
+                                options.get("vad", False))
+    pipeline.on_progress = on_progress
+    pipeline.should_stop = should_stop
+    cached_srt = pipeline.run()
+
+    output_dir = job_output_dir(job_id)
+    srt_path = os.path.join(output_dir, os.path.splitext(os.path.basename(job["video_path"]))[0] + ".srt")
+    shutil.copyfile(cached_srt, srt_path)
+    queue.update(job_id, srt_path=srt_path)
+
+    document_path = ""
+    if options.get("optimize"):
+        from text_optimization import API_KEY_ENV_VARS, TextOptimizer
+        provider = options.get("api_provider", "OpenAI")
+        api_key = os.getenv(API_KEY_ENV_VARS.get(provider, ""), "")
+        if not api_key:
+            raise RuntimeError(f"未配置 {provider} 的API密钥")
+        segments = srt_to_optimize_segments(srt_path)
+        optimizer = TextOptimizer(api_key, provider)
+        content = optimizer.optimize_segments(segments, lambda p: on_progress(100 + p // 4), should_stop)
+        if content is None:
+            return
+        document_path = os.path.join(output_dir, "document.html")
+        with open(document_path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+    queue.finish(job_id, DONE, progress=100, document_path=document_path)
+
+
+def apply_resource_limits(niceness: int) -> None:
+    # 内存上限由服务进程按 RSS 检查，见 process_rss_mb
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+
+
+def process_rss_mb(pid: int) -> Optional[int]:
+    # 读取 /proc/<pid>/statm 中的常驻页数；非 Linux 平台返回 None，不检查内存
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def worker_main(db_path: str, num_threads: int, niceness: int) -> None:
+    from dotenv import load_dotenv
+    from audio import AudioDecodeError
+    from transcription import TranscriptionCancelled
+
+    load_dotenv()
+    apply_resource_limits(niceness)
+    queue = JobQueue(db_path)
+    while True:
+        job = queue.claim()
+        if job is None:
+            time.sleep(POLL_SECONDS)
+            continue
+        try:
+            process_job(queue, job, num_threads)
+        except TranscriptionCancelled:
+            pass  # 状态已由取消方写入
+        except (AudioDecodeError, RuntimeError, OSError, MemoryError) as e:
+            queue.finish(job["id"], FAILED, message=str(e))
+        except Exception as e:
+            queue.finish(job["id"], FAILED, message=f"{type(e).__name__}: {e}")
+
+
+def serve(db_path: str, workers: int, num_threads: int, max_memory_mb: int, niceness: int) -> None:
+    queue = JobQueue(db_path)
+    queue.requeue_interrupted()
+    context = multiprocessing.get_context("spawn")
+    args = (db_path, num_threads, niceness)
+    processes = []
+    for _ in range(workers):
+        process = context.Process(target=worker_main, args=args, daemon=True)
+        process.start()
+        processes.append(process)
+    print(f"批处理服务已启动: {workers} 个工作进程，数据库 {db_path}")
+    try:
+        while True:
+            queue.heartbeat()
+            # 工作进程超出内存上限或意外退出时，把它的任务标记为失败并补充新进程
+            for i, process in enumerate(processes):
+                rss_mb = process_rss_mb(process.pid) if max_memory_mb and process.is_alive() else None
+                if rss_mb is not None and rss_mb > max_memory_mb:
+                    queue.fail_worker_jobs(process.pid, f"工作进程内存 {rss_mb} MB 超出上限 {max_memory_mb} MB")
+                    process.kill()
+                    process.join()
+                if not process.is_alive():
+                    queue.fail_worker_jobs(process.pid, f"工作进程异常退出 (exit code {process.exitcode})")
+                    processes[i] = context.Process(target=worker_main, args=args, daemon=True)
+                    processes[i].start()
+            time.sleep(HEARTBEAT_SECONDS)
+    except KeyboardInterrupt:
+        print("正在停止批处理服务...")
+    finally:
+        for process in processes:
+            process.terminate()
+        # 被中断的任务下次启动时重新排队
+        queue.requeue_interrupted()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="视频格式化处理器批处理服务")
+    parser.add_argument("--db", default=default_db_path(), help="任务数据库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动批处理服务")
+    serve_parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 4))
+    serve_parser.add_argument("--threads", type=int, default=0, help="每个工作进程的CPU线程数，0 为平分")
+    serve_parser.add_argument("--max-memory-mb", type=int, default=0, help="每个工作进程的常驻内存(RSS)上限，0 为不限")
+    serve_parser.add_argument("--nice", type=int, default=10, help="工作进程的nice值")
+
+    submit_parser = subparsers.add_parser("submit", help="提交视频")
+    submit_parser.add_argument("videos", nargs="+")
+    submit_parser.add_argument("--model", default="small")
+    submit_parser.add_argument("--backend", default="openai-whisper")
+    submit_parser.add_argument("--compute-type", default="default")
+    submit_parser.add_argument("--vad", action="store_true")
+    submit_parser.add_argument("--optimize", action="store_true", help="同时进行书面化处理")
+    submit_parser.add_argument("--api-provider", default="OpenAI")
+
+    subparsers.add_parser("list", help="查看任务状态")
+    cancel_parser = subparsers.add_parser("cancel", help="取消任务")
+    cancel_parser.add_argument("job_id", type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+        serve(args.db, args.workers, threads, args.max_memory_mb, args.nice)
+        return
+
+    queue = JobQueue(args.db)
+    if args.command == "submit":
+        options = {"model": args.model, "backend": args.backend, "compute_type": args.compute_type,
+                   "vad": args.vad, "optimize": args.optimize, "api_provider": args.api_provider}
+        for video in args.videos:
+            print(f"{queue.submit(video, options)}\t{video}")
+    elif args.command == "list":
+        for job in queue.list_jobs():
+            print(f"{job['id']}\t{job['status']}\t{job['progress']}%\t{job['video_path']}\t{job['message']}")
+    elif args.command == "cancel":
+        queue.cancel(args.job_id)
+    if not queue.server_alive():
+        print("提示: 批处理服务未运行，请执行 python job_server.py serve", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# job_window.py
+from PyQt5.QtCore import QTimer, pyqtSignal
+from PyQt5.QtWidgets import (QDialog, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout)
+
+from job_server import CANCELLED, DONE, FAILED, JobQueue
+
+STATUS_LABELS = {
+    "queued": "排队中",
+    "running": "处理中",
+    DONE: "已完成",
+    FAILED: "失败",
+    CANCELLED: "已取消",
+}
+
+REFRESH_INTERVAL_MS = 2000
+
+
+class JobListDialog(QDialog):
+    # 查看批处理任务，双击已完成的任务取回字幕或书面化文档
+    subtitles_requested = pyqtSignal(str, str)  # (视频路径, 字幕路径)
+    document_requested = pyqtSignal(str)  # 文档路径
+
+    def __init__(self, queue: JobQueue, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self.setWindowTitle("批处理任务")
+        self.resize(800, 400)
+
+        layout = QVBoxLayout(self)
+        self.server_label = QLabel()
+        layout.addWidget(self.server_label)
+
+        self.table = QTableWidget(0, 5, self)
+        self.table.setHorizontalHeaderLabels(["编号", "视频", "状态", "进度", "信息"])
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.cellDoubleClicked.connect(self.open_result)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.cancel_button = QPushButton("取消任务", self)
+        self.cancel_button.clicked.connect(self.cancel_selected)
+        button_layout.addWidget(self.cancel_button)
+        self.retry_button = QPushButton("重新排队", self)
+        self.retry_button.clicked.connect(self.retry_selected)
+        button_layout.addWidget(self.retry_button)
+        self.open_button = QPushButton("打开结果", self)
+        self.open_button.clicked.connect(lambda: self.open_result(self.table.currentRow(), 0))
+        button_layout.addWidget(self.open_button)
+        layout.addLayout(button_layout)
+
+        self.jobs = []
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_INTERVAL_MS)
+        self.refresh()
+
+    def refresh(self):
+        if self.queue.server_alive():
+            self.server_label.setText("批处理服务运行中")
+        else:
+            self.server_label.setText("批处理服务未运行，请在终端执行: python job_server.py serve")
+
+        self.jobs = self.queue.list_jobs()
+        self.table.setRowCount(len(self.jobs))
+        for row, job in enumerate(self.jobs):
+            values = [str(job["id"]), job["video_path"], STATUS_LABELS.get(job["status"], job["status"]),
+                      f"{job['progress']}%", job["message"]]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def selected_job(self):
+        row = self.table.currentRow()
+        if 0 <= row < len(self.jobs):
+            return self.jobs[row]
+        return None
+
+    def cancel_selected(self):
+        job = self.selected_job()
+        if job is not None:
+            self.queue.cancel(job["id"])
+            self.refresh()
+
+    def retry_selected(self):
+        job = self.selected_job()
+        if job is not None:
+            self.queue.retry(job["id"])
+            self.refresh()
+
+    def open_result(self, row, _column):
+        if not 0 <= row < len(self.jobs):
+            return
+        job = self.queue.get(self.jobs[row]["id"])
+        if job is None or job["status"] != DONE:
+            return
+        if job["document_path"]:
+            self.document_requested.emit(job["document_path"])
+        else:
+            self.subtitles_requested.emit(job["video_path"], job["srt_path"])
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
@@ -0,0 +1,127 @@
+# model_registry.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# 各模型常驻内存的粗略估计(MB)，用于模型尚未加载时的预算判断
+ESTIMATED_MODEL_MB = {
+    "tiny": 150,
+    "base": 300,
+    "small": 1000,
+    "medium": 3000,
+    "large": 6000,
+}
+
+DEFAULT_MEMORY_BUDGET_MB = 8192
+
+
+def estimate_model_bytes(model: Any) -> int:
+    # 对 torch 模型统计参数与缓冲区实际占用的字节数
+    try:
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        return int(total)
+    except AttributeError:
+        return 0
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb: Optional[int] = None):
+        if memory_budget_mb is None:
+            memory_budget_mb = int(os.getenv("WHISPER_MODEL_MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB))
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._models: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._loading: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def set_memory_budget(self, memory_budget_mb: int) -> None:
+        with self._lock:
+            self.memory_budget = memory_budget_mb * 1024 * 1024
+            self._evict(keep=None)
+
+    def is_loaded(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._models
+
+    def get(self, key: Hashable, loader: Optional[Callable[[], Any]] = None, size_hint: int = 0) -> Any:
+        if loader is None:
+            def loader():
+                import whisper
+                return whisper.load_model(key)
+
+        while True:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)  # 标记为最近使用
+                    return self._models[key]
+                event = self._loading.get(key)
+                if event is None:
+                    # 当前线程负责加载，其他线程等待同一个模型加载完成
+                    event = threading.Event()
+                    self._loading[key] = event
+                    break
+            event.wait()
+
+        try:
+            model = loader()
+        except Exception:
+            with self._lock:
+                self._loading.pop(key).set()
+            raise
+
+        # 非 torch 模型(如 CTranslate2)无法统计参数，使用调用方给出的估计值
+        size = estimate_model_bytes(model) or size_hint
+        if size == 0 and isinstance(key, str):
+            size = ESTIMATED_MODEL_MB.get(key, 0) * 1024 * 1024
+        with self._lock:
+            self._models[key] = model
+            self._sizes[key] = size
+            self._evict(keep=key)
+            self._loading.pop(key).set()
+        return model
+
+    def warm_up(self, key: Hashable, loader: Optional[Callable[[], Any]] = None, size_hint: int = 0) -> threading.Thread:
+        # 在后台线程中预加载模型，加载失败只打印错误，不影响界面
+        def _load():
+            try:
+                self.get(key, loader, size_hint)
+            except Exception as e:
+                print(f"Error warming up model {key}: {e}")
+
+        thread = threading.Thread(target=_load, daemon=True)
+        thread.start()
+        return thread
+
+    def release(self, key: Hashable) -> None:
+        with self._lock:
+            self._models.pop(key, None)
+            self._sizes.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+
+    def _evict(self, keep: Optional[Hashable]) -> None:
+        # 按最近最少使用顺序淘汰模型，直到总占用不超过预算；刚加载的模型始终保留
+        while sum(self._sizes.values()) > self.memory_budget:
+            victim = next((k for k in self._models if k != keep), None)
+            if victim is None:
+                break
+            del self._models[victim]
+            del self._sizes[victim]
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    # 进程级单例，跨多次 SubtitleThread 运行复用已加载的模型
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
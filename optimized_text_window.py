@@ -5,16 +5,19 @@ from PyQt5.QtGui import QTextCursor
 import docx
 from io import BytesIO
 from PIL import Image
-import base64
-from typing import Tuple
+from typing import Optional, Tuple
+from image_store import ImageStore
 
 class OptimizedTextWindow(QMainWindow):
-    def __init__(self, optimized_content: str):
+    def __init__(self, optimized_content: str, image_store: Optional[ImageStore] = None):
         super().__init__()
+        self.image_store = image_store or ImageStore()
         self.init_ui(optimized_content)
 
     def init_ui(self, optimized_content: str) -> None:
         self.textEdit = QTextEdit(self)
+        # 书面化结果中的图片是编辑框图片存储的引用，先注册为文档资源
+        self.image_store.register(self.textEdit.document(), optimized_content)
         self.textEdit.setHtml(optimized_content)
 
         exportButton = QPushButton("导出到Word", self)
@@ -62,11 +65,10 @@ class OptimizedTextWindow(QMainWindow):
             cursor = QTextCursor(block)
             if cursor.charFormat().isImageFormat():
                 image_format = cursor.charFormat().toImageFormat()
-                base64_str = image_format.name()
-                if base64_str.startswith('data:image/png;base64,'):
-                    base64_str = base64_str.split(',')[1]
-
-                image_data = base64.b64decode(base64_str)
+                image_data = self.image_store.image_bytes(image_format.name())
+                if image_data is None:
+                    block = block.next()
+                    continue
                 temp_stream = BytesIO(image_data)
                 temp_image = Image.open(temp_stream)
                 temp_width, temp_height = temp_image.size
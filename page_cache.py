@@ -0,0 +1,54 @@
+# page_cache.py
+# PDF 页面渲染结果的磁盘缓存：按文档内容哈希、页码和 DPI 保存 PNG，重新打开同一份 PDF 时无需再次渲染
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+from disk_cache import DiskLRUCache, cache_root, file_identity
+
+DEFAULT_MAX_MB = 500
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class PageCache:
+    def __init__(self, directory: Optional[str] = None, max_mb: Optional[int] = None):
+        if directory is None:
+            directory = os.path.join(cache_root(), "pages")
+        if max_mb is None:
+            max_mb = int(os.getenv("VFP_PAGE_CACHE_MB", DEFAULT_MAX_MB))
+        self.store_cache = DiskLRUCache(directory, max_mb * 1024 * 1024)
+        # 文件路径/大小/修改时间 -> 内容哈希，同一文件只读取一次
+        self._lock = threading.Lock()
+        self._digests: Dict[str, str] = {}
+
+    def document_hash(self, pdf_path: str) -> str:
+        identity = file_identity(pdf_path)
+        with self._lock:
+            digest = self._digests.get(identity)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(pdf_path, "rb") as file:
+                for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b""):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+            with self._lock:
+                self._digests[identity] = digest
+        return digest
+
+    @staticmethod
+    def _name(digest: str, page_number: int, dpi: int) -> str:
+        return os.path.join(digest, str(dpi), f"{page_number}.png")
+
+    def get(self, digest: str, page_number: int, dpi: int) -> Optional[bytes]:
+        return self.store_cache.get_bytes(self._name(digest, page_number, dpi))
+
+    def contains(self, digest: str, page_number: int, dpi: int) -> bool:
+        return os.path.exists(self.store_cache.path_for(self._name(digest, page_number, dpi)))
+
+    def put(self, digest: str, page_number: int, dpi: int, data: bytes) -> None:
+        # 渲染时逐页写入，容量检查需要遍历目录，由调用方在一批页面写完后执行 cleanup
+        self.store_cache.put_bytes(self._name(digest, page_number, dpi), data, cleanup=False)
+
+    def cleanup(self) -> None:
+        self.store_cache.cleanup()
@@ -0,0 +1,74 @@
+# pdf_render.py
+# 多进程渲染 PDF 页面：每个工作进程各自打开一份文档，按页段并行渲染为 PNG，结果按页码顺序回传
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import fitz
+
+PAGES_PER_TASK = 4  # 页段越小，结果按顺序回传得越及时
+PARALLEL_MIN_PAGES = 60  # 页数较少时进程启动的开销比渲染本身更大
+
+PageCallback = Callable[[int, bytes], None]
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+# ---- 进程池工作进程 ----
+_worker_document: Optional["fitz.Document"] = None
+
+
+def _init_worker(pdf_path: str) -> None:
+    global _worker_document
+    _worker_document = fitz.open(pdf_path)
+
+
+def _render_in_worker(index: int, pages: List[int], dpi: int) -> Tuple[int, List[Tuple[int, bytes]]]:
+    results = []
+    for page_number in pages:
+        try:
+            pix = _worker_document.load_page(page_number).get_pixmap(dpi=dpi, alpha=False)
+            results.append((page_number, pix.tobytes("png")))
+        except (RuntimeError, ValueError) as e:
+            print(f"Error rendering PDF page {page_number + 1}: {e}")
+    return index, results
+
+
+def render_pages_parallel(pdf_path: str, pages: Iterable[int], dpi: int, workers: int,
+                          on_page: Optional[PageCallback] = None,
+                          should_stop: Optional[Callable[[], bool]] = None) -> int:
+    # 先完成的页段暂存，前面的页段全部完成后才依次回传；返回已回传的页数
+    pages = sorted(set(pages))
+    tasks = [pages[i:i + PAGES_PER_TASK] for i in range(0, len(pages), PAGES_PER_TASK)]
+    if not tasks:
+        return 0
+    workers = max(1, min(workers, len(tasks)))
+    # 使用 spawn 避免在已启动 Qt 线程的进程中 fork
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(pdf_path,))
+    finished: Dict[int, List[Tuple[int, bytes]]] = {}
+    next_task = 0
+    rendered = 0
+    try:
+        pending = {executor.submit(_render_in_worker, index, task, dpi) for index, task in enumerate(tasks)}
+        while next_task < len(tasks):
+            if should_stop and should_stop():
+                break
+            # 定时醒来检查取消请求
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, results = future.result()
+                finished[index] = results
+            while next_task in finished:
+                for page_number, data in finished.pop(next_task):
+                    rendered += 1
+                    if on_page:
+                        on_page(page_number, data)
+                next_task += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return rendered
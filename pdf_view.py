@@ -0,0 +1,336 @@
+# pdf_view.py
+# 演示 PDF 缩略图列表：只渲染可视区域内的页面，渲染在后台线程中进行，缩略图按内存上限做 LRU 缓存。
+# 插入编辑框时才按原始分辨率渲染单页。渲染结果写入磁盘缓存，重新打开同一份 PDF 时直接读取。
+# 页数较多时另用进程池按页码顺序预渲染全部缩略图
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import fitz
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSize, Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPixmap
+from PyQt5.QtWidgets import QAbstractItemView, QListView
+
+from image_store import encode_png
+from page_cache import PageCache
+from pdf_render import PARALLEL_MIN_PAGES, default_workers, render_pages_parallel
+
+THUMBNAIL_DPI = 36  # 原实现把 72 DPI 的页面缩小一半显示
+INSERT_DPI = 72  # 与 page.get_pixmap() 的默认分辨率一致
+THUMBNAIL_CACHE_MB = 64
+MAX_PENDING_PAGES = 64  # 快速滚动时丢弃最早的请求，只保留最近可见的页面
+
+# PyMuPDF 不支持多线程同时调用，所有 fitz 操作都需持有该锁
+fitz_lock = threading.Lock()
+
+
+def render_page(document: "fitz.Document", page_number: int, dpi: int) -> QImage:
+    with fitz_lock:
+        pix = document.load_page(page_number).get_pixmap(dpi=dpi, alpha=False)
+        # QImage 不持有 samples 的内存，需要复制一份
+        return QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888).copy()
+
+
+def load_page_pngs(pdf_path: str, page_cache: PageCache, pages: Iterable[int], dpi: int,
+                   should_stop: Optional[Callable[[], bool]] = None) -> Dict[int, bytes]:
+    # 供后台线程批量取页面 PNG：先读磁盘缓存，其余页面交给进程池渲染并写入缓存
+    pngs: Dict[int, bytes] = {}
+    try:
+        digest = page_cache.document_hash(pdf_path)
+    except OSError as e:
+        print(f"Error opening PDF: {e}")
+        return pngs
+    remaining = []
+    for page_number in sorted(set(pages)):
+        data = page_cache.get(digest, page_number, dpi)
+        if data is None:
+            remaining.append(page_number)
+        else:
+            pngs[page_number] = data
+
+    def on_page(page_number: int, data: bytes) -> None:
+        pngs[page_number] = data
+        try:
+            page_cache.put(digest, page_number, dpi, data)
+        except OSError as e:
+            print(f"Error writing page cache: {e}")
+
+    render_pages_parallel(pdf_path, remaining, dpi, default_workers(), on_page, should_stop)
+    page_cache.cleanup()
+    return pngs
+
+
+class PdfRenderThread(QThread):
+    # 后台渲染缩略图，请求按后进先出处理，最新滚动到的页面最先出图
+    page_rendered = pyqtSignal(int, object)
+
+    def __init__(self, pdf_path: str, page_cache: PageCache, dpi: int = THUMBNAIL_DPI, parent=None):
+        super().__init__(parent)
+        self.pdf_path = pdf_path
+        self.page_cache = page_cache
+        self.dpi = dpi
+        self.pending: List[int] = []
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def request(self, page_number: int) -> None:
+        with self.condition:
+            if page_number in self.pending:
+                self.pending.remove(page_number)
+            self.pending.append(page_number)
+            del self.pending[:-MAX_PENDING_PAGES]
+            self.condition.notify()
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.pending.clear()
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        try:
+            digest = self.page_cache.document_hash(self.pdf_path)
+            with fitz_lock:
+                document = fitz.open(self.pdf_path)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Error opening PDF: {e}")
+            return
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                page_number = self.pending.pop()
+            data = self.page_cache.get(digest, page_number, self.dpi)
+            image = QImage.fromData(data) if data is not None else QImage()
+            if image.isNull():
+                try:
+                    image = render_page(document, page_number, self.dpi)
+                    self.page_cache.put(digest, page_number, self.dpi, encode_png(image))
+                except (OSError, RuntimeError, ValueError) as e:
+                    print(f"Error rendering PDF page {page_number + 1}: {e}")
+                    continue
+            self.page_rendered.emit(page_number, image)
+        with fitz_lock:
+            document.close()
+        self.page_cache.cleanup()
+
+
+class PdfPrerenderThread(QThread):
+    # 用进程池渲染尚未缓存的页面并写入磁盘缓存，按页码顺序上报
+    page_ready = pyqtSignal(int, bytes)
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, pdf_path: str, page_cache: PageCache, pages: Iterable[int], dpi: int,
+                 workers: int = 0, parent=None):
+        super().__init__(parent)
+        self.pdf_path = pdf_path
+        self.page_cache = page_cache
+        self.pages = list(pages)
+        self.dpi = dpi
+        self.workers = workers or default_workers()
+
+    def run(self):
+        try:
+            digest = self.page_cache.document_hash(self.pdf_path)
+        except OSError as e:
+            print(f"Error opening PDF: {e}")
+            return
+        total = len(self.pages)
+        remaining = [p for p in self.pages if not self.page_cache.contains(digest, p, self.dpi)]
+        done = total - len(remaining)
+        self.progress.emit(done, total)
+
+        def on_page(page_number: int, data: bytes) -> None:
+            nonlocal done
+            done += 1
+            try:
+                self.page_cache.put(digest, page_number, self.dpi, data)
+            except OSError as e:
+                print(f"Error writing page cache: {e}")
+            self.page_ready.emit(page_number, data)
+            self.progress.emit(done, total)
+
+        try:
+            render_pages_parallel(self.pdf_path, remaining, self.dpi, self.workers, on_page,
+                                  self.isInterruptionRequested)
+        except Exception as e:
+            print(f"Error rendering PDF: {e}")
+        self.page_cache.cleanup()
+
+    def stop(self) -> None:
+        self.requestInterruption()
+        self.wait()
+
+
+class PdfPageModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.page_cache = PageCache()
+        self.pdf_path = ""
+        self.document: Optional["fitz.Document"] = None
+        self.page_count = 0
+        self.thumbnail_size = QSize()
+        self.placeholder = QPixmap()
+        self.worker: Optional[PdfRenderThread] = None
+        self.prerender: Optional[PdfPrerenderThread] = None
+        self.bulk_jobs: List[PdfPrerenderThread] = []
+        self.cache: "OrderedDict[int, QPixmap]" = OrderedDict()
+        self.cache_bytes = 0
+        self.max_cache_bytes = THUMBNAIL_CACHE_MB * 1024 * 1024
+        self.requested = set()
+
+    def open(self, pdf_path: str) -> None:
+        with fitz_lock:
+            document = fitz.open(pdf_path)
+            page_count = len(document)
+            # 列表使用统一行高，以第一页的尺寸为准
+            rect = document.load_page(0).rect if page_count else fitz.Rect(0, 0, 4, 3)
+        self.beginResetModel()
+        self.close()
+        self.pdf_path, self.document, self.page_count = pdf_path, document, page_count
+        scale = THUMBNAIL_DPI / 72
+        self.thumbnail_size = QSize(max(1, round(rect.width * scale)), max(1, round(rect.height * scale)))
+        self.placeholder = QPixmap(self.thumbnail_size)
+        self.placeholder.fill(QColor("#eeeeee"))
+        self.worker = PdfRenderThread(pdf_path, self.page_cache, THUMBNAIL_DPI, self)
+        self.worker.page_rendered.connect(self.on_page_rendered)
+        self.worker.start(QThread.LowPriority)
+        if page_count >= PARALLEL_MIN_PAGES:
+            # 大文件同时在多个进程中按顺序渲染全部缩略图，可见页面仍由上面的线程优先渲染
+            self.prerender = PdfPrerenderThread(pdf_path, self.page_cache, range(page_count), THUMBNAIL_DPI,
+                                                parent=self)
+            self.prerender.page_ready.connect(self.on_page_encoded)
+            self.prerender.start(QThread.LowPriority)
+        self.endResetModel()
+
+    def close(self) -> None:
+        if self.prerender is not None:
+            self.prerender.stop()
+            self.prerender.deleteLater()
+            self.prerender = None
+        for thread in self.bulk_jobs:
+            thread.stop()
+        self.bulk_jobs.clear()
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker.deleteLater()
+            self.worker = None
+        if self.document is not None:
+            with fitz_lock:
+                self.document.close()
+            self.document = None
+        self.page_count = 0
+        self.cache.clear()
+        self.cache_bytes = 0
+        self.requested.clear()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.page_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        page_number = index.row()
+        if role == Qt.DecorationRole:
+            # 视图只会为可见的行取图标，未缓存时先显示占位图并请求后台渲染
+            pixmap = self.cache.get(page_number)
+            if pixmap is not None:
+                self.cache.move_to_end(page_number)
+                return pixmap
+            if page_number not in self.requested and self.worker is not None:
+                self.requested.add(page_number)
+                self.worker.request(page_number)
+            return self.placeholder
+        if role == Qt.ToolTipRole:
+            return f"第 {page_number + 1} 页"
+        return None
+
+    def on_page_rendered(self, page_number: int, image: QImage) -> None:
+        if self.sender() is not self.worker:
+            return  # 已关闭文档的渲染结果
+        self._store_thumbnail(page_number, image)
+
+    def on_page_encoded(self, page_number: int, data: bytes) -> None:
+        # 进程池的结果已写入磁盘缓存，只有正在等待显示的页面才需要解码
+        if self.sender() is not self.prerender or page_number not in self.requested:
+            return
+        image = QImage.fromData(data)
+        if not image.isNull():
+            self._store_thumbnail(page_number, image)
+
+    def _store_thumbnail(self, page_number: int, image: QImage) -> None:
+        self.requested.discard(page_number)
+        pixmap = QPixmap.fromImage(image)
+        if page_number in self.cache:
+            old = self.cache.pop(page_number)
+            self.cache_bytes -= old.width() * old.height() * 4
+        self.cache[page_number] = pixmap
+        self.cache_bytes += pixmap.width() * pixmap.height() * 4
+        while self.cache_bytes > self.max_cache_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.width() * evicted.height() * 4
+        index = self.index(page_number)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def create_prerender(self, dpi: int, workers: int = 0) -> Optional[PdfPrerenderThread]:
+        # 预渲染全部页面到磁盘缓存，之后按该 DPI 插入时直接读取。
+        # 返回未启动的线程，调用方连接好信号后再 start，页面已全部缓存时也不会丢失完成信号
+        if self.document is None:
+            return None
+        thread = PdfPrerenderThread(self.pdf_path, self.page_cache, range(self.page_count), dpi, workers, self)
+        thread.finished.connect(lambda: self.bulk_jobs.remove(thread) if thread in self.bulk_jobs else None)
+        thread.finished.connect(thread.deleteLater)
+        self.bulk_jobs.append(thread)
+        return thread
+
+    def page_png(self, page_number: int, dpi: int = INSERT_DPI) -> Optional[bytes]:
+        # 优先使用缓存中已编码的 PNG，插入编辑框时无需再次渲染和编码
+        if self.document is None or not 0 <= page_number < self.page_count:
+            return None
+        try:
+            digest = self.page_cache.document_hash(self.pdf_path)
+        except OSError:
+            digest = None
+        data = self.page_cache.get(digest, page_number, dpi) if digest else None
+        if data is None:
+            data = encode_png(render_page(self.document, page_number, dpi))
+            if digest:
+                try:
+                    self.page_cache.put(digest, page_number, dpi, data)
+                except OSError as e:
+                    print(f"Error writing page cache: {e}")
+        return data
+
+
+class PdfSlideList(QListView):
+    page_activated = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.page_model = PdfPageModel(self)
+        self.insert_dpi = INSERT_DPI
+        self.setModel(self.page_model)
+        self.setUniformItemSizes(True)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.doubleClicked.connect(lambda index: self.page_activated.emit(index.row()))
+
+    def open_pdf(self, pdf_path: str) -> None:
+        self.page_model.open(pdf_path)
+        self.setIconSize(self.page_model.thumbnail_size)
+        self.scrollToTop()
+
+    def close_pdf(self) -> None:
+        self.page_model.beginResetModel()
+        self.page_model.close()
+        self.page_model.endResetModel()
+
+    def page_png(self, page_number: int) -> Optional[bytes]:
+        return self.page_model.page_png(page_number, self.insert_dpi)
+
+    def prerender(self, dpi: int, workers: int = 0) -> Optional[PdfPrerenderThread]:
+        self.insert_dpi = dpi
+        return self.page_model.create_prerender(dpi, workers)
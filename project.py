@@ -0,0 +1,96 @@
+# project.py
+# 项目文件(.vfp)：zip 容器，分别保存编辑内容、字幕、去重后的图片、视频/PDF 路径和书面化结果。
+# 打开时只读取文本，图片在显示时才从容器中读取。cues.srt 供其他工具直接使用，
+# 打开项目时字幕时间由编辑内容本身重建，不读取该文件
+import json
+import os
+import tempfile
+import time
+import zipfile
+from typing import List, Optional
+
+from cues import CueList
+from image_store import IMAGE_SCHEME, ImageStore, referenced_images
+
+PROJECT_VERSION = 1
+PROJECT_SUFFIX = ".vfp"
+
+
+class ProjectError(RuntimeError):
+    pass
+
+
+class Project:
+    def __init__(self, html: str = "", video_path: str = "", pdf_path: str = "",
+                 optimized_results: Optional[List[str]] = None, cues: Optional[CueList] = None):
+        self.html = html
+        self.video_path = video_path
+        self.pdf_path = pdf_path
+        self.optimized_results = optimized_results or []
+        self.cues = cues if cues is not None else CueList()
+
+
+def _image_member(name: str) -> str:
+    return f"images/{name[len(IMAGE_SCHEME) + 1:]}.png"
+
+
+def save_project(path: str, project: Project, image_store: ImageStore) -> None:
+    # 先写入临时文件再替换，保存中途出错不会损坏原项目
+    names = sorted(set(referenced_images(project.html)))
+    # 替换文件前读出全部图片，当前存储可能还在从旧项目文件中按需读取
+    image_store.encode_all(names)
+    images = [(name, image_store.png_bytes(name)) for name in names]
+
+    manifest = {
+        "version": PROJECT_VERSION,
+        "saved_at": time.time(),
+        "video_path": project.video_path,
+        "pdf_path": project.pdf_path,
+        "optimized_results": len(project.optimized_results),
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file, zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+            archive.writestr("document.html", project.html)
+            archive.writestr("cues.srt", project.cues.to_srt())
+            for i, content in enumerate(project.optimized_results):
+                archive.writestr(f"optimized/{i}.html", content)
+            for name, data in images:
+                if data is not None:
+                    # PNG 本身已压缩，直接存储
+                    archive.writestr(zipfile.ZipInfo(_image_member(name)), data, zipfile.ZIP_STORED)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_project(path: str, image_store: ImageStore) -> Project:
+    try:
+        archive = zipfile.ZipFile(path, "r")
+        manifest = json.loads(archive.read("manifest.json"))
+        if manifest.get("version", 0) > PROJECT_VERSION:
+            raise ProjectError("项目文件由更新版本的程序创建")
+        html = archive.read("document.html").decode("utf-8")
+        optimized_results = [archive.read(f"optimized/{i}.html").decode("utf-8")
+                             for i in range(manifest.get("optimized_results", 0))]
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise ProjectError(f"无法读取项目文件: {e}") from e
+
+    members = set(archive.namelist())
+
+    def read_image(name: str) -> Optional[bytes]:
+        member = _image_member(name)
+        if member not in members:
+            return None
+        with zipfile.ZipFile(path, "r") as image_archive:
+            return image_archive.read(member)
+
+    archive.close()
+    image_store.set_loader(read_image)
+    return Project(html, manifest.get("video_path", ""), manifest.get("pdf_path", ""), optimized_results)
@@ -1,11 +1,14 @@
 # rich_text_editor.py
 from PyQt5.QtWidgets import QTextEdit, QApplication, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox, QCheckBox, QHBoxLayout, QToolBar, QAction, QFileDialog, QVBoxLayout, QWidget
-from PyQt5.QtCore import QMimeData, Qt, QSize
+from PyQt5.QtCore import QMimeData, Qt, QSize, QRegularExpression, QUrl
 from PyQt5.QtGui import QTextCursor, QTextDocument, QIcon, QMouseEvent, QKeyEvent
 from PyQt5.QtWidgets import QGroupBox, QRadioButton 
 from PyQt5.QtGui import QTextCursor, QTextDocument, QTextCharFormat, QColor  # 添加 QColor 导入
-from bs4 import BeautifulSoup
-from typing import Callable, Optional, List, Dict
+from PyQt5.QtGui import QImage, QTextImageFormat
+from typing import Any, Callable, Iterator, Optional, List, Dict, Pattern
+import re
+from search_index import SearchIndex, build_search_pattern, utf16_converter
+from image_store import IMAGE_SCHEME, ImageStore
 
 class FindReplaceDialog(QDialog):
     def __init__(self, editor, replace_mode=False):
@@ -23,8 +26,12 @@ class FindReplaceDialog(QDialog):
         
         self.find_label = QLabel("查找内容(N):")
         self.find_input = QLineEdit()
+        self.find_input.textChanged.connect(self.update_search_index)
         layout.addWidget(self.find_label)
         layout.addWidget(self.find_input)
+        self.match_count_label = QLabel()
+        layout.addWidget(self.match_count_label)
+        self.editor.search_index.count_changed.connect(self.update_match_count)
 
         self.replace_label = QLabel("替换为(D):")
         self.replace_input = QLineEdit()
@@ -67,11 +74,66 @@ class FindReplaceDialog(QDialog):
         self.case_sensitive_checkbox = QCheckBox("区分大小写(C)")
         layout.addWidget(self.case_sensitive_checkbox)
         
+        self.whole_word_checkbox = QCheckBox("全字匹配(W)")
+        layout.addWidget(self.whole_word_checkbox)
+
+        self.regex_checkbox = QCheckBox("正则表达式(X)")
+        layout.addWidget(self.regex_checkbox)
+
         self.wrap_checkbox = QCheckBox("循环(R)")
         layout.addWidget(self.wrap_checkbox)
 
+        for checkbox in (self.case_sensitive_checkbox, self.whole_word_checkbox, self.regex_checkbox):
+            checkbox.toggled.connect(self.update_search_index)
+
         self.setLayout(layout)
 
+    def update_search_index(self, *_):
+        # 查找条件变化时在后台重建匹配索引，并高亮可视区域内的全部匹配
+        text = self.find_input.text()
+        if not text:
+            self.editor.search_index.clear()
+            return
+        try:
+            pattern = build_search_pattern(text, self.case_sensitive_checkbox.isChecked(),
+                                           self.whole_word_checkbox.isChecked(), self.regex_checkbox.isChecked())
+        except re.error:
+            self.editor.search_index.clear()
+            self.match_count_label.setText("正则表达式无效")
+            return
+        self.match_count_label.setText("正在统计...")
+        self.editor.search_index.set_pattern(pattern)
+
+    def update_match_count(self, count):
+        if self.find_input.text() and self.editor.search_index.ready:
+            self.match_count_label.setText(f"共 {count} 处匹配")
+        elif not self.find_input.text():
+            self.match_count_label.clear()
+
+    def find_with_index(self, direction, wrap_around):
+        # 索引就绪时按块号二分定位上一个/下一个匹配，返回是否找到
+        search_index = self.editor.search_index
+        cursor = self.editor.textCursor()
+        if direction == 'down':
+            found = search_index.next_match(cursor.selectionEnd(), wrap_around)
+        else:
+            found = search_index.previous_match(cursor.selectionStart(), wrap_around)
+        if found is None:
+            return False
+        position, length = found
+        cursor.setPosition(position)
+        cursor.setPosition(position + length, QTextCursor.KeepAnchor)
+        self.editor.setTextCursor(cursor)
+        return True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_search_index()
+
+    def closeEvent(self, event):
+        self.editor.search_index.clear()
+        super().closeEvent(event)
+
     def find_text(self):
         text = self.find_input.text()
         direction = 'down' if self.down_radio.isChecked() else 'up'  # 获取查找方向
@@ -82,19 +144,24 @@ class FindReplaceDialog(QDialog):
             QMessageBox.warning(self, "输入错误", "请输入查找内容。")
             return
         
+        if self.editor.search_index.ready and self.editor.search_index.pattern is not None:
+            if not self.find_with_index(direction, wrap_around):
+                QMessageBox.warning(self, "未找到", "未找到指定文本。")
+            return
+
+        whole_word = self.whole_word_checkbox.isChecked()
+        use_regex = self.regex_checkbox.isChecked()
         cursor = self.editor.textCursor()
         cursor.beginEditBlock()
-        found = self.editor.find_text(text, direction, case_sensitive)
+        found = self.editor.find_text(text, direction, case_sensitive, whole_word, use_regex)
 
         if not found and wrap_around:  # 如果未找到且选择了循环查找            
             cursor.movePosition(QTextCursor.Start)  # 移动到文档开头
             self.editor.setTextCursor(cursor)  # 设置光标到开头
-            found = self.editor.findText(text, direction, case_sensitive)  # 从头开始查找
+            found = self.editor.find_text(text, direction, case_sensitive, whole_word, use_regex)  # 从头开始查找
         if found:
-            # 选中找到的文本
-            cursor.setPosition(found.position())  # 设置光标到找到的文本位置
-            cursor.movePosition(QTextCursor.Left, QTextCursor.KeepAnchor, len(text))  # 选中找到的文本
-            self.editor.setTextCursor(cursor)
+            # 选中找到的文本，正则匹配的长度可能与输入不同，直接使用查找结果的选区
+            self.editor.setTextCursor(found)
             pass  # 不关闭对话框
         else:
             QMessageBox.warning(self, "未找到", "未找到指定文本。")
@@ -104,53 +171,48 @@ class FindReplaceDialog(QDialog):
         find_text = self.find_input.text()
         replace_text = self.replace_input.text()
         case_sensitive = self.case_sensitive_checkbox.isChecked()
+        whole_word = self.whole_word_checkbox.isChecked()
+        use_regex = self.regex_checkbox.isChecked()
         direction = 'down' if self.down_radio.isChecked() else 'up'  # 获取查找方向
         if not find_text:
             QMessageBox.warning(self, "输入错误", "请输入查找内容。")
-            return     
-                
-        found = self.editor.find_text(find_text, direction, case_sensitive)
+            return
+
+        try:
+            pattern = build_search_pattern(find_text, case_sensitive, whole_word, use_regex)
+        except re.error as e:
+            QMessageBox.warning(self, "正则表达式错误", str(e))
+            return
+        found = self.editor.find_text(find_text, direction, case_sensitive, whole_word, use_regex)
         if found:
-            cursor.beginEditBlock()
-            cursor = self.editor.textCursor()
-            cursor.setPosition(found.position())  # 设置光标到找到的文本位置
-            cursor.movePosition(QTextCursor.Left, QTextCursor.KeepAnchor, len(find_text))  # 选中找到的文本                        
-            cursor.removeSelectedText()  # 移除选中的文本
-            cursor.insertText(replace_text)  # 替换找到的文本
-            self.editor.setTextCursor(cursor)
-            cursor.endEditBlock()
+            # 直接替换查找结果的选区，正则匹配的长度可能与输入不同
+            if use_regex:
+                match = pattern.fullmatch(found.selectedText())
+                replace_text = match.expand(replace_text) if match else replace_text
+            found.beginEditBlock()
+            found.insertText(replace_text)
+            found.endEditBlock()
+            self.editor.setTextCursor(found)
             QMessageBox.information(self, "替换成功", "已替换指定文本。")
         else:
             QMessageBox.warning(self, "未找到", "未找到指定文本。")
-        
+
     def replace_all_text(self):
         find_text = self.find_input.text()
         replace_text = self.replace_input.text()
-        case_sensitive = self.case_sensitive_checkbox.isChecked()
-        direction = 'down' if self.down_radio.isChecked() else 'up'  # 获取查找方向
+        use_regex = self.regex_checkbox.isChecked()
 
         if not find_text:
             QMessageBox.warning(self, "输入错误", "请输入查找内容。")
             return
 
-        cursor = self.editor.textCursor()
-
-        count = 0
-        cursor.beginEditBlock()
-        found = False
-        while True:
-            found = self.editor.find_text(find_text, direction, case_sensitive)
-            if not found:
-                break
-            cursor = self.editor.textCursor()      
-            cursor.setPosition(found.position())  # 设置光标到找到的文本位置
-            cursor.movePosition(QTextCursor.Left, QTextCursor.KeepAnchor, len(find_text))  # 选中找到的文本
-                  
-            cursor.removeSelectedText()  # 移除选中的文本
-            cursor.insertText(replace_text)  # 替换找到的文本
-            self.editor.setTextCursor(cursor)    
-            count += 1
-        cursor.endEditBlock()
+        try:
+            pattern = build_search_pattern(find_text, self.case_sensitive_checkbox.isChecked(),
+                                           self.whole_word_checkbox.isChecked(), use_regex)
+            count = self.editor.replace_all(pattern, replace_text, use_regex)
+        except re.error as e:
+            QMessageBox.warning(self, "正则表达式错误", str(e))
+            return
         QMessageBox.information(self, "替换完成", f"已替换 {count} 个实例。")
 
 class RichTextEditor(QTextEdit):
@@ -159,6 +221,10 @@ class RichTextEditor(QTextEdit):
         self.mouse_move_event_handler: Optional[Callable] = None
         self.find_dialog: Optional[FindReplaceDialog] = None
         self.replace_dialog: Optional[FindReplaceDialog] = None
+        # 按用途分组的 ExtraSelections(播放高亮等)，只影响绘制，不修改文档内容和撤销栈
+        self.extra_selection_groups: Dict[str, List[QTextEdit.ExtraSelection]] = {}
+        self.search_index = SearchIndex(self)  # 查找对话框使用的全文匹配索引
+        self.image_store = ImageStore()  # 文档中的图片只保存引用，图片数据按内容哈希存放在这里
         self.setStyleSheet("""
             QTextEdit {
                 selection-background-color: blue;
@@ -201,13 +267,64 @@ class RichTextEditor(QTextEdit):
         filename, _ = QFileDialog.getOpenFileName(self, "打开HTML文件", last_directory, "HTML Files (*.html *.htm)")
         if filename:
             with open(filename, "r", encoding="utf-8") as file:
-                self.setHtml(file.read())
+                self.setHtml(self.image_store.absorb_html(file.read()))
 
     def save_html(self) -> None:
         filename, _ = QFileDialog.getSaveFileName(self, "保存HTML文件", "", "HTML Files (*.html)")
         if filename:
             with open(filename, "w", encoding="utf-8") as file:
-                file.write(self.toHtml())
+                file.write(self.image_store.inline_html(self.toHtml()))
+
+    def append_plain_text(self, text: str) -> None:
+        # 使用独立光标在文档末尾追加，不影响用户当前的光标和选区
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+
+    def insert_image(self, image: QImage) -> None:
+        self._insert_stored_image(self.image_store.add_image(image))
+
+    def insert_encoded_image(self, data: bytes, cursor: Optional[QTextCursor] = None) -> bool:
+        # 已编码的 PNG 直接收入存储，保存项目和导出时不再重新编码；指定 cursor 时插入到该位置
+        name = self.image_store.add_encoded(data)
+        if name is None:
+            return False
+        self._insert_stored_image(name, cursor)
+        return True
+
+    def _insert_stored_image(self, name: str, cursor: Optional[QTextCursor] = None) -> None:
+        # 文档中只插入图片引用，并写明尺寸，排版时无需解码图片
+        image = self.image_store.image(name)
+        self.document().addResource(QTextDocument.ImageResource, QUrl(name), image)
+        image_format = QTextImageFormat()
+        image_format.setName(name)
+        image_format.setWidth(image.width())
+        image_format.setHeight(image.height())
+        if cursor is not None:
+            cursor.insertImage(image_format)
+            return
+        cursor = self.textCursor()
+        cursor.insertImage(image_format)
+        self.setTextCursor(cursor)
+
+    def loadResource(self, resource_type: int, name: QUrl):
+        # 文档被清空或重新加载后资源表会丢失，从图片存储中补回
+        if resource_type == QTextDocument.ImageResource and name.scheme() == IMAGE_SCHEME:
+            image = self.image_store.image(name.toString())
+            if image is not None:
+                return image
+        return super().loadResource(resource_type, name)
+
+    def set_extra_selection_group(self, name: str, selections: List[QTextEdit.ExtraSelection]) -> None:
+        if selections:
+            self.extra_selection_groups[name] = selections
+        else:
+            self.extra_selection_groups.pop(name, None)
+        self.setExtraSelections([s for group in self.extra_selection_groups.values() for s in group])
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self.search_index.schedule_highlights()
 
     def set_mouse_move_event(self, handler: Callable) -> None:
         self.mouseMoveEvent = handler
@@ -218,7 +335,7 @@ class RichTextEditor(QTextEdit):
             return
 
         mimeData = QMimeData()
-        mimeData.setHtml(cursor.selection().toHtml())
+        mimeData.setHtml(self.image_store.inline_html(cursor.selection().toHtml()))
         QApplication.clipboard().setMimeData(mimeData)
 
     def mouse_move_event(self, event: QMouseEvent) -> None:
@@ -244,7 +361,8 @@ class RichTextEditor(QTextEdit):
             self.replace_dialog = FindReplaceDialog(self, replace_mode=True)
         self.replace_dialog.show()  # 显示对话框
 
-    def find_text(self, text: str, direction: str = 'down', case_sensitive: bool = False) -> bool:
+    def find_text(self, text: str, direction: str = 'down', case_sensitive: bool = False,
+                  whole_word: bool = False, use_regex: bool = False) -> bool:
         cursor = self.textCursor()
         found = False
 
@@ -254,39 +372,71 @@ class RichTextEditor(QTextEdit):
         flags = QTextDocument.FindFlags()
         if direction == 'up':
             flags |= QTextDocument.FindBackward
-        found = document.find(text, cursor, flags)
+        if case_sensitive:
+            flags |= QTextDocument.FindCaseSensitively
+        if whole_word:
+            flags |= QTextDocument.FindWholeWords
+        if use_regex:
+            options = QRegularExpression.NoPatternOption if case_sensitive else QRegularExpression.CaseInsensitiveOption
+            found = document.find(QRegularExpression(text, options), cursor, flags)
+        else:
+            found = document.find(text, cursor, flags)
         if not found.isNull():  # 检查是否找到有效文本            
             self.setTextCursor(cursor)      
         else:
             found = False
         return found  # 返回是否找到文本
     
-    def extract_text_and_images(self) -> List[Dict[str, str]]:
-        html_content = self.toHtml()
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        segments = []
-        current_text = ''  # 用于累积当前段落的文本
-
-        for p_element in soup.find_all('p'):
-            # 检查 <p> 标签内是否有 <span>，如果有则提取文本
-            span_elements = p_element.find_all('span')
-            for span in span_elements:
-                current_text += span.get_text() + '\n'
-
-            # 检查 <p> 标签内是否有 <img>，如果有则提取图片
-            img_elements = p_element.find_all('img')
-            for img in img_elements:
-                # 遇到图片时，先添加累积的文本（如果有）
-                if current_text:
-                    segments.append({'type': 'text', 'content': current_text.strip()})
-                    current_text = ''  # 重置文本累积
-
-                # 然后添加图片的 HTML
-                image_html = str(img)  # 或使用 img.prettify()
-                segments.append({'type': 'image', 'content': f"<p>{image_html}</p>"})
-
-         # 不要忘记添加最后一个累积的文本段落（如果有）
-        if current_text:
-            segments.append({'type': 'text', 'content': current_text.strip()})
-        return segments
\ No newline at end of file
+    def replace_all(self, pattern: Pattern, replacement: str, use_regex: bool = False) -> int:
+        # 对全文只扫描一次，先算出全部替换结果，再在同一个编辑块中从后向前替换，整体只占一步撤销
+        document = self.document()
+        text = document.toPlainText()
+        replacements = [(match.start(), match.end(), match.expand(replacement) if use_regex else replacement)
+                        for match in pattern.finditer(text)]
+        if not replacements:
+            return 0
+
+        to_position = utf16_converter(text)
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        for start, end, new_text in reversed(replacements):
+            cursor.setPosition(to_position(start))
+            cursor.setPosition(to_position(end), QTextCursor.KeepAnchor)
+            cursor.insertText(new_text)
+        cursor.endEditBlock()
+        return len(replacements)
+
+    def iter_segments(self) -> Iterator[Dict[str, Any]]:
+        # 直接遍历文档的块和片段，按顺序逐个产出文本段和图片段；图片只传引用名和尺寸
+        lines: List[str] = []
+        block = self.document().begin()
+        while block.isValid():
+            line = []
+            iterator = block.begin()
+            while not iterator.atEnd():
+                fragment = iterator.fragment()
+                iterator += 1
+                char_format = fragment.charFormat()
+                if not char_format.isImageFormat():
+                    line.append(fragment.text())
+                    continue
+                # 遇到图片时，先产出累积的文本
+                lines.append("".join(line))
+                line = []
+                text = "\n".join(lines).strip()
+                if text:
+                    yield {'type': 'text', 'content': text}
+                lines = []
+                image_format = char_format.toImageFormat()
+                for _ in range(fragment.length()):  # 相邻的同一图片会合并为一个片段
+                    yield {'type': 'image', 'image': image_format.name(),
+                           'width': image_format.width(), 'height': image_format.height()}
+            lines.append("".join(line).replace("\u2028", "\n"))
+            block = block.next()
+
+        text = "\n".join(lines).strip()
+        if text:
+            yield {'type': 'text', 'content': text}
+
+    def extract_text_and_images(self) -> List[Dict[str, Any]]:
+        return list(self.iter_segments())
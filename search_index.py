@@ -0,0 +1,249 @@
+# search_index.py
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, List, Optional, Pattern, Tuple
+
+from PyQt5.QtCore import QObject, QPoint, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor, QTextCursor
+from PyQt5.QtWidgets import QTextEdit
+
+# 超出基本多文种平面的字符在 Qt 中占两个位置(UTF-16 代理对)
+ASTRAL_CHAR_RE = re.compile('[\U00010000-\U0010FFFF]')
+
+HIGHLIGHT_COLOR = "#ffd27f"
+REBUILD_DELAY_MS = 200
+VIEWPORT_DELAY_MS = 30
+
+# (块内偏移, 长度)，单位与 Qt 文档位置一致
+Match = Tuple[int, int]
+
+
+def build_search_pattern(text: str, case_sensitive: bool = False, whole_word: bool = False,
+                         use_regex: bool = False) -> Pattern:
+    pattern = text if use_regex else re.escape(text)
+    if whole_word:
+        pattern = rf"\b(?:{pattern})\b"
+    flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+    return re.compile(pattern, flags)
+
+
+def utf16_converter(text: str) -> Callable[[int], int]:
+    # 把 Python 字符串下标换算为 Qt 的 UTF-16 位置
+    astral = [match.start() for match in ASTRAL_CHAR_RE.finditer(text)]
+    if not astral:
+        return lambda index: index
+    return lambda index: index + bisect_left(astral, index)
+
+
+def find_block_matches(pattern: Pattern, text: str) -> List[Match]:
+    to_position = utf16_converter(text)
+    matches = []
+    for match in pattern.finditer(text):
+        if match.end() > match.start():  # 空匹配无法高亮和选中
+            start = to_position(match.start())
+            matches.append((start, to_position(match.end()) - start))
+    return matches
+
+
+class SearchIndexThread(QThread):
+    # 在后台线程中对块文本快照做匹配，结果按生成序号回传，过期结果由界面线程丢弃
+    finished_signal = pyqtSignal(int, object)
+
+    def __init__(self, generation: int, pattern: Pattern, texts: List[str], parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.pattern = pattern
+        self.texts = texts
+
+    def run(self):
+        result = []
+        for number, text in enumerate(self.texts):
+            if number % 1024 == 0 and self.isInterruptionRequested():
+                return
+            matches = find_block_matches(self.pattern, text)
+            if matches:
+                result.append((number, matches))
+        self.finished_signal.emit(self.generation, result)
+
+
+class SearchIndex(QObject):
+    # 编辑框全文匹配索引：记录含匹配的块号及块内匹配位置，随编辑增量更新，
+    # 支持即时统计总数、O(log n) 跳转上一个/下一个以及只高亮可视区域内的匹配
+    count_changed = pyqtSignal(int)
+
+    def __init__(self, editor: QTextEdit):
+        super().__init__(editor)
+        self.editor = editor
+        self.document = editor.document()
+        self.pattern: Optional[Pattern] = None
+        self.blocks = array('q')
+        self.matches: List[List[Match]] = []
+        self.total = 0
+        self.ready = False
+        self.block_count = self.document.blockCount()
+        self.generation = 0
+        self.worker: Optional[SearchIndexThread] = None
+
+        self.rebuild_timer = QTimer(self)
+        self.rebuild_timer.setSingleShot(True)
+        self.rebuild_timer.setInterval(REBUILD_DELAY_MS)
+        self.rebuild_timer.timeout.connect(self.rebuild)
+        self.viewport_timer = QTimer(self)
+        self.viewport_timer.setSingleShot(True)
+        self.viewport_timer.setInterval(VIEWPORT_DELAY_MS)
+        self.viewport_timer.timeout.connect(self.update_highlights)
+
+        self.document.documentLayout()  # 文档没有布局时不会发出 contentsChange
+        self.document.contentsChange.connect(self.on_contents_change)
+        editor.verticalScrollBar().valueChanged.connect(self.schedule_highlights)
+        editor.horizontalScrollBar().valueChanged.connect(self.schedule_highlights)
+
+    def set_pattern(self, pattern: Optional[Pattern]) -> None:
+        self.pattern = pattern
+        self.rebuild()
+
+    def clear(self) -> None:
+        self.set_pattern(None)
+
+    def rebuild(self) -> None:
+        self.rebuild_timer.stop()
+        self.generation += 1
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.worker = None
+        self.blocks, self.matches = array('q'), []
+        self.ready = False
+        self.block_count = self.document.blockCount()
+        if self.pattern is None:
+            self._set_total(0)
+            self.ready = True
+            self.update_highlights()
+            return
+
+        # 界面线程只负责复制块文本，匹配在后台线程中完成
+        texts = []
+        block = self.document.begin()
+        while block.isValid():
+            texts.append(block.text())
+            block = block.next()
+        self.worker = SearchIndexThread(self.generation, self.pattern, texts, self)
+        self.worker.finished_signal.connect(self.on_worker_finished)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.worker.start(QThread.LowPriority)
+
+    def on_worker_finished(self, generation: int, result) -> None:
+        if generation != self.generation:
+            return
+        self.worker = None
+        self.blocks = array('q', (number for number, _ in result))
+        self.matches = [matches for _, matches in result]
+        self.ready = True
+        self._set_total(sum(len(matches) for matches in self.matches))
+        self.update_highlights()
+
+    def on_contents_change(self, position: int, chars_removed: int, chars_added: int) -> None:
+        if self.pattern is None:
+            self.block_count = self.document.blockCount()
+            return
+        if not self.ready:
+            # 后台建立索引期间文档有变化，快照已过期，稍后重建
+            self.rebuild_timer.start()
+            return
+
+        document = self.document
+        delta = document.blockCount() - self.block_count
+        self.block_count = document.blockCount()
+        first_block = document.findBlock(position)
+        last_block = document.findBlock(position + chars_added)
+        if not first_block.isValid():
+            self.rebuild_timer.start()
+            return
+        first = first_block.blockNumber()
+        last = last_block.blockNumber() if last_block.isValid() else self.block_count - 1
+
+        # 变更前受影响的块为 [first, last - delta]，只重新匹配这些块，之后的块号整体平移 delta
+        lo = bisect_left(self.blocks, first)
+        hi = bisect_right(self.blocks, last - delta)
+        blocks, matches = array('q'), []
+        block = first_block
+        while block.isValid() and block.blockNumber() <= last:
+            found = find_block_matches(self.pattern, block.text())
+            if found:
+                blocks.append(block.blockNumber())
+                matches.append(found)
+            block = block.next()
+
+        removed = sum(len(m) for m in self.matches[lo:hi])
+        tail = self.blocks[hi:]
+        if delta:
+            tail = array('q', (number + delta for number in tail))
+        self.blocks = self.blocks[:lo] + blocks + tail
+        self.matches[lo:hi] = matches
+        self._set_total(self.total - removed + sum(len(m) for m in matches))
+        self.schedule_highlights()
+
+    def _set_total(self, total: int) -> None:
+        self.total = total
+        self.count_changed.emit(total)
+
+    def _absolute(self, index: int, match: Match) -> Tuple[int, int]:
+        block = self.document.findBlockByNumber(self.blocks[index])
+        return block.position() + match[0], match[1]
+
+    def next_match(self, position: int, wrap: bool = True) -> Optional[Tuple[int, int]]:
+        # 返回 position 之后第一个匹配的 (文档位置, 长度)
+        if not self.ready or not self.blocks:
+            return None
+        block = self.document.findBlock(position)
+        number, offset = block.blockNumber(), position - block.position()
+        i = bisect_left(self.blocks, number)
+        if i < len(self.blocks) and self.blocks[i] == number:
+            j = bisect_left(self.matches[i], (offset, -1))
+            if j < len(self.matches[i]):
+                return self._absolute(i, self.matches[i][j])
+            i += 1
+        if i < len(self.blocks):
+            return self._absolute(i, self.matches[i][0])
+        return self._absolute(0, self.matches[0][0]) if wrap else None
+
+    def previous_match(self, position: int, wrap: bool = True) -> Optional[Tuple[int, int]]:
+        # 返回在 position 之前开始的最后一个匹配
+        if not self.ready or not self.blocks:
+            return None
+        block = self.document.findBlock(position)
+        number, offset = block.blockNumber(), position - block.position()
+        i = bisect_left(self.blocks, number)
+        if i < len(self.blocks) and self.blocks[i] == number:
+            j = bisect_left(self.matches[i], (offset, -1)) - 1
+            if j >= 0:
+                return self._absolute(i, self.matches[i][j])
+        i -= 1
+        if i >= 0:
+            return self._absolute(i, self.matches[i][-1])
+        return self._absolute(len(self.blocks) - 1, self.matches[-1][-1]) if wrap else None
+
+    def schedule_highlights(self, *_) -> None:
+        if self.pattern is not None or self.editor.extra_selection_groups.get("search"):
+            self.viewport_timer.start()
+
+    def update_highlights(self) -> None:
+        # 只为可视区域内的块生成高亮，匹配再多也不影响绘制速度
+        if self.pattern is None or not self.blocks:
+            self.editor.set_extra_selection_group("search", [])
+            return
+        viewport = self.editor.viewport()
+        first = self.editor.cursorForPosition(QPoint(0, 0)).blockNumber()
+        last = self.editor.cursorForPosition(QPoint(viewport.width(), viewport.height())).blockNumber()
+        selections = []
+        brush = QBrush(QColor(HIGHLIGHT_COLOR))
+        for i in range(bisect_left(self.blocks, first), bisect_right(self.blocks, last)):
+            block_position = self.document.findBlockByNumber(self.blocks[i]).position()
+            for offset, length in self.matches[i]:
+                selection = QTextEdit.ExtraSelection()
+                selection.format.setBackground(brush)
+                selection.cursor = QTextCursor(self.document)
+                selection.cursor.setPosition(block_position + offset)
+                selection.cursor.setPosition(block_position + offset + length, QTextCursor.KeepAnchor)
+                selections.append(selection)
+        self.editor.set_extra_selection_group("search", selections)
@@ -0,0 +1,279 @@
+# slide_align.py
+# 幻灯片与字幕自动对齐：按固定频率抽取视频帧，计算视频帧和 PDF 页面的感知哈希(pHash)，
+# 通过分段哈希索引找出候选页面，再用缩略图逐像素比较选出最接近的一页(模板相同的幻灯片哈希往往相同)，
+# 检测幻灯片切换的时刻，再把对应页面插入到该时刻的字幕边界处。适用于幻灯片占满画面的录屏类视频
+import re
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from audio import probe_duration
+from page_cache import PageCache
+from pdf_view import INSERT_DPI, fitz_lock, load_page_pngs
+
+FRAME_SIZE = 64  # 视频帧和页面统一缩小到 64x64 灰度图，用于候选页的精确比较
+HASH_INPUT_SIZE = 32  # 再按 2x2 平均到 32x32 后计算 DCT
+HASH_SIZE = 8  # 取左上角 8x8 低频系数，共 64 位
+BANDS = 8  # 64 位哈希按字节分为 8 段建立索引
+# 汉明距离不超过 BANDS - 1 时至少有一段完全相同(抽屉原理)，一定能从索引中找到；
+# 距离稍大的页面大多也至少有一段相同
+MAX_DISTANCE = 10
+PAGE_RENDER_SIZE = FRAME_SIZE * 4  # 页面先渲染到 256x256 再按 4x4 区域平均，与 ffmpeg 的 area 缩放一致
+DEFAULT_SAMPLE_FPS = 0.5
+CUE_SNAP_MS = 1000  # 切换前不超过该时长开始的字幕也视为切换后的第一条，插入到它之前
+MIN_STABLE_SAMPLES = 2  # 连续匹配到同一页的帧数不少于该值才算切换到该页，过滤翻页动画和遮挡
+PTS_TIME_RE = re.compile(r"pts_time:\s*([0-9.]+)")
+
+# 0-255 每个字节中 1 的个数
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+ProgressCallback = Callable[[float], None]
+# (出现时刻毫秒, 页码)
+SlideChange = Tuple[int, int]
+
+
+class SlideAlignError(RuntimeError):
+    pass
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(HASH_INPUT_SIZE)[:HASH_SIZE]
+
+
+def phash(images: np.ndarray) -> np.ndarray:
+    # images: (N, 64, 64) 灰度图，返回 (N,) uint64。一次矩阵乘法完成全部图片的 DCT
+    factor = FRAME_SIZE // HASH_INPUT_SIZE
+    images = images.astype(np.float32).reshape(len(images), HASH_INPUT_SIZE, factor, HASH_INPUT_SIZE, factor)
+    coefficients = _DCT @ images.mean(axis=(2, 4)) @ _DCT.T
+    flat = coefficients.reshape(len(images), HASH_SIZE * HASH_SIZE)
+    median = np.median(flat[:, 1:], axis=1, keepdims=True)  # 不计直流分量
+    bits = np.packbits(flat > median, axis=1, bitorder="little")
+    return np.ascontiguousarray(bits).view(np.uint64).ravel()
+
+
+def fingerprints(images: np.ndarray) -> np.ndarray:
+    # 去掉亮度和对比度差异后的像素向量，均方差越小越相似
+    flat = images.reshape(len(images), -1).astype(np.float32)
+    flat -= flat.mean(axis=1, keepdims=True)
+    flat /= flat.std(axis=1, keepdims=True) + 1e-6
+    return flat
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    xor = np.bitwise_xor(a, b).astype(np.uint64)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+
+class HashIndex:
+    # 把页面哈希按字节分段建立倒排表，查询时只与任一段相同的候选页计算汉明距离，
+    # 距离在阈值内的候选页再按缩略图均方差排序
+    def __init__(self, hashes: np.ndarray, page_fingerprints: Optional[np.ndarray] = None):
+        self.hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+        self.fingerprints = page_fingerprints
+        band_values = self.hashes.view(np.uint8).reshape(-1, BANDS)
+        self.buckets: List[List[np.ndarray]] = []
+        for band in range(BANDS):
+            order = np.argsort(band_values[:, band], kind="stable")
+            bounds = np.searchsorted(band_values[order, band], np.arange(257))
+            self.buckets.append([order[bounds[v]:bounds[v + 1]] for v in range(256)])
+
+    def match(self, queries: np.ndarray, query_fingerprints: Optional[np.ndarray] = None,
+              max_distance: int = MAX_DISTANCE) -> Tuple[np.ndarray, np.ndarray]:
+        # 返回每个查询最接近的页码及汉明距离，没有距离不超过 max_distance 的页面时页码为 -1
+        queries = np.ascontiguousarray(queries, dtype=np.uint64)
+        rerank = self.fingerprints is not None and query_fingerprints is not None
+        query_bands = queries.view(np.uint8).reshape(-1, BANDS)
+        pages = np.full(len(queries), -1, dtype=np.int64)
+        distances = np.full(len(queries), HASH_SIZE * HASH_SIZE + 1, dtype=np.int64)
+        for i, bands in enumerate(query_bands):
+            candidates = np.unique(np.concatenate([self.buckets[band][value] for band, value in enumerate(bands)]))
+            if not len(candidates):
+                continue
+            candidate_distances = hamming(self.hashes[candidates], queries[i])
+            close = candidate_distances <= max_distance
+            if not close.any():
+                continue
+            candidates, candidate_distances = candidates[close], candidate_distances[close]
+            if rerank and len(candidates) > 1:
+                errors = np.square(self.fingerprints[candidates] - query_fingerprints[i]).mean(axis=1)
+                best = int(np.argmin(errors))
+            else:
+                best = int(np.argmin(candidate_distances))
+            pages[i] = candidates[best]
+            distances[i] = candidate_distances[best]
+        return pages, distances
+
+
+def pdf_page_images(pdf_path: str, should_stop: Optional[Callable[[], bool]] = None) -> np.ndarray:
+    # 返回 (页数, 64, 64) 灰度图
+    images = []
+    with fitz_lock:
+        document = fitz.open(pdf_path)
+    try:
+        for page_number in range(len(document)):
+            if should_stop and should_stop():
+                raise SlideAlignError("已取消")
+            with fitz_lock:
+                page = document.load_page(page_number)
+                # 横纵分别缩放到固定尺寸，与视频帧的缩放方式一致
+                matrix = fitz.Matrix(PAGE_RENDER_SIZE / page.rect.width, PAGE_RENDER_SIZE / page.rect.height)
+                pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+                samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+            image = np.zeros((PAGE_RENDER_SIZE, PAGE_RENDER_SIZE), dtype=np.float32)
+            height, width = min(pix.height, PAGE_RENDER_SIZE), min(pix.width, PAGE_RENDER_SIZE)
+            image[:height, :width] = samples[:height, :width]
+            factor = PAGE_RENDER_SIZE // FRAME_SIZE
+            images.append(image.reshape(FRAME_SIZE, factor, FRAME_SIZE, factor).mean(axis=(1, 3)))
+    finally:
+        with fitz_lock:
+            document.close()
+    if not images:
+        return np.zeros((0, FRAME_SIZE, FRAME_SIZE), dtype=np.float32)
+    return np.stack(images)
+
+
+def sample_video_frames(video_path: str, sample_fps: float = DEFAULT_SAMPLE_FPS, keyframes_only: bool = False,
+                        on_progress: Optional[ProgressCallback] = None,
+                        should_stop: Optional[Callable[[], bool]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # ffmpeg 直接输出 64x64 灰度原始帧到管道，帧时间从 showinfo 日志中读取。
+    # 默认按 sample_fps 解码采样。keyframes_only 为快速模式，只解码关键帧，长视频的解码时间可缩短一个数量级，
+    # 但实际采样间隔取决于编码器的关键帧间距(录屏软件常为数秒)，sample_fps 只是上限，切换时刻会相应延后
+    interval = 1 / sample_fps
+    select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval:.3f})'"
+    video_filter = f"{select},scale={FRAME_SIZE}:{FRAME_SIZE}:flags=area,format=gray,showinfo"
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-nostats", "-loglevel", "info", "-threads", "0"]
+    if keyframes_only:
+        command += ["-skip_frame", "nokey"]
+    command += ["-i", video_path, "-map", "0:v:0", "-an", "-sn", "-vf", video_filter,
+                "-vsync", "0", "-f", "rawvideo", "-"]
+    duration = probe_duration(video_path)
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError as e:
+        raise SlideAlignError(f"ffmpeg not found: {e}")
+
+    # showinfo 写在 stderr 中，单独线程读取，避免两个管道互相阻塞
+    times: List[float] = []
+    log_tail: List[str] = []
+
+    def read_log():
+        for line in process.stderr:
+            text = line.decode("utf-8", "replace")
+            match = PTS_TIME_RE.search(text)
+            if match:
+                times.append(float(match.group(1)))
+            else:
+                log_tail[:] = (log_tail + [text])[-20:]
+
+    log_reader = threading.Thread(target=read_log, daemon=True)
+    log_reader.start()
+
+    frame_bytes = FRAME_SIZE * FRAME_SIZE
+    frames = bytearray()
+    try:
+        while True:
+            data = process.stdout.read(frame_bytes * 64)
+            if not data:
+                break
+            frames += data
+            if should_stop and should_stop():
+                raise SlideAlignError("已取消")
+            if on_progress and duration > 0 and times:
+                on_progress(min(times[-1] / duration, 1.0))
+        process.wait()
+        log_reader.join()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    if process.returncode != 0:
+        raise SlideAlignError(f"视频帧抽取失败: {''.join(log_tail).strip()}")
+
+    count = min(len(frames) // frame_bytes, len(times))
+    images = np.frombuffer(bytes(frames[:count * frame_bytes]), dtype=np.uint8)
+    images = images.reshape(count, FRAME_SIZE, FRAME_SIZE)
+    times_ms = (np.array(times[:count]) * 1000).astype(np.int64)
+    return times_ms, images
+
+
+def detect_slide_changes(times_ms: np.ndarray, pages: np.ndarray, min_stable: int = MIN_STABLE_SAMPLES,
+                         first_appearance_only: bool = True) -> List[SlideChange]:
+    # 把逐帧的匹配结果切分为连续匹配到同一页的区段，过短的区段视为过渡画面丢弃，
+    # 每个区段的起点即该页出现的时刻
+    if not len(pages):
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(pages)) + 1))
+    lengths = np.diff(np.concatenate((starts, [len(pages)])))
+    changes: List[SlideChange] = []
+    seen = set()
+    for start, length in zip(starts, lengths):
+        page = int(pages[start])
+        if page < 0 or length < min_stable:
+            continue
+        if changes and changes[-1][1] == page:
+            continue  # 中间只隔了过渡画面，仍是同一页
+        if first_appearance_only and page in seen:
+            continue
+        seen.add(page)
+        changes.append((int(times_ms[start]), page))
+    return changes
+
+
+def align_slides(video_path: str, pdf_path: str, sample_fps: float = DEFAULT_SAMPLE_FPS,
+                 keyframes_only: bool = False, on_progress: Optional[ProgressCallback] = None,
+                 should_stop: Optional[Callable[[], bool]] = None) -> List[SlideChange]:
+    page_images = pdf_page_images(pdf_path, should_stop)
+    if not len(page_images):
+        return []
+    index = HashIndex(phash(page_images), fingerprints(page_images))
+    times_ms, frames = sample_video_frames(video_path, sample_fps, keyframes_only, on_progress, should_stop)
+    if not len(frames):
+        return []
+    pages, _ = index.match(phash(frames), fingerprints(frames))
+    # 关键帧稀疏，只出现在一个关键帧中的幻灯片也保留
+    return detect_slide_changes(times_ms, pages, 1 if keyframes_only else MIN_STABLE_SAMPLES)
+
+
+class SlideAlignThread(QThread):
+    # 完成后发出 (切换列表, {页码: 插入用 PNG})，页面在本线程中取出或渲染，界面线程只负责插入
+    finished_signal = pyqtSignal(list, object)
+    progress_signal = pyqtSignal(int)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, video_path: str, pdf_path: str, sample_fps: float = DEFAULT_SAMPLE_FPS,
+                 keyframes_only: bool = False, page_cache: Optional[PageCache] = None,
+                 dpi: int = INSERT_DPI, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+        self.pdf_path = pdf_path
+        self.sample_fps = sample_fps
+        self.keyframes_only = keyframes_only
+        self.page_cache = page_cache or PageCache()
+        self.dpi = dpi
+
+    def run(self):
+        try:
+            changes = align_slides(self.video_path, self.pdf_path, self.sample_fps, self.keyframes_only,
+                                   lambda fraction: self.progress_signal.emit(int(fraction * 100)),
+                                   self.isInterruptionRequested)
+            pngs: Dict[int, bytes] = load_page_pngs(self.pdf_path, self.page_cache,
+                                                    (page for _, page in changes), self.dpi,
+                                                    self.isInterruptionRequested)
+        except (SlideAlignError, RuntimeError, ValueError, OSError) as e:
+            print(f"Error aligning slides: {e}")
+            self.error_signal.emit(str(e))
+            return
+        if self.isInterruptionRequested():
+            return
+        self.finished_signal.emit(changes, pngs)
@@ -1,89 +1,198 @@
 import os
-import subprocess
-import whisper
+import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+from asr_backends import create_backend
+from audio import AudioDecodeError, load_audio
+from cues import CueList
+from transcription import (LOW_PRIORITY_NICE, TranscriptionCancelled, lower_priority, split_windows,
+                           transcribe_parallel, transcribe_serial)
+from transcript_cache import get_transcript_cache
+from vad import SpeechTimeline, build_timeline
+
+class SubtitlePipeline:
+    # 与界面无关的字幕生成流程：提取音频 -> 静音检测 -> 分块转写 -> 写入缓存。
+    # SubtitleThread 和批处理服务都通过它完成转写
+    LANGUAGE = "zh"
+
+    def __init__(self, video_path: str, model_name: str, workers: int = 1,
+                 backend: str = "openai-whisper", compute_type: str = "default", num_threads: int = 0,
+                 vad: bool = False):
+        self.video_path = video_path
+        self.model_name = model_name
+        self.workers = workers  # 大于 1 时按分块在多个进程中并行转写
+        self.backend = create_backend(backend, model_name, compute_type, num_threads)
+        self.vad = vad  # 转写前跳过静音、掌声等非语音部分
+        # 后台预生成：降低 nice 值、只用一半核心，尽量不与用户的操作争抢 CPU
+        self.low_priority = False
+        self.timeline: Optional[SpeechTimeline] = None
+        self.cache_key = ""
+        self.finished_chunks: Dict[int, List[Dict[str, Any]]] = {}
+        # 已推送的全部片段(原始时间轴)，界面中途接管后台任务时据此补齐
+        self.segments: List[Dict[str, Any]] = []
+        self.on_progress: Callable[[int], None] = lambda progress: None
+        self.on_segments: Callable[[List[Dict[str, Any]]], None] = lambda segments: None
+        self.should_stop: Callable[[], bool] = lambda: False
+
+    def extract_audio(self) -> np.ndarray:
+        # 解码为内存中的 16kHz 单声道 float32 PCM，直接交给模型
+        return load_audio(self.video_path)
+
+    def format_as_srt(self, transcription_segments: List[Dict[str, Any]], start_index: int = 1) -> str:
+        return CueList.from_segments(transcription_segments, start_index).to_srt()
+
+    def cache_params(self) -> Dict[str, Any]:
+        # 影响转写结果的全部参数，与音频哈希一起构成缓存键
+        # 线程数不影响识别结果，不计入缓存键
+        spec = self.backend.spec()
+        return {"backend": spec["name"], "model": spec["model_name"], "compute_type": spec["compute_type"],
+                "vad": self.vad, "decode_options": self.decode_options()}
+
+    def lookup_cached(self) -> str:
+        # 仅查已知指纹，不读取视频文件，命中时返回字幕文件路径，否则返回空字符串
+        return get_transcript_cache().lookup_media(self.video_path, self.cache_params()) or ""
+
+    def run(self) -> str:
+        # 返回生成的字幕文件路径；音频或识别引擎出错时抛出 AudioDecodeError/RuntimeError，
+        # 取消时抛出 TranscriptionCancelled
+        if self.low_priority:
+            # 之后启动的 ffmpeg 子进程和计算线程都继承调用线程的 nice 值
+            lower_priority()
+        cache = get_transcript_cache()
+        self.cache_key = cache.make_key(cache.fingerprint(self.video_path), self.cache_params())
+        cached_path = cache.lookup(self.cache_key)
+        if cached_path:
+            self.on_progress(100)
+            return cached_path
+
+        self.on_progress(10)  # 开始提取音频
+        audio = self.extract_audio()
+        self.on_progress(30)  # 音频提取完成
+        if self.should_stop():
+            raise TranscriptionCancelled()
+
+        if self.vad:
+            # 只把语音区拼接后送入模型，结果时间戳再映射回原始时间轴
+            self.timeline = build_timeline(audio)
+            if self.timeline:
+                audio = self.timeline.compact(audio)
+
+        # 同一视频和参数之前中断过时，从最后完成的分块继续
+        self.finished_chunks = cache.start_checkpoint(self.cache_key, split_windows(len(audio)))
+
+        if self.workers > 1 or self.low_priority:
+            # 各工作进程自行加载模型；后台任务也走工作进程，
+            # 因为界面进程中已加载的 CTranslate2 模型在加载时就固定了线程池和优先级
+            result = self.transcribe_parallel(audio)
+        else:
+            self.backend.model()
+            self.on_progress(40)  # 模型加载完成(已加载的模型直接复用)
+
+            # 使用自定义的回调函数来获取转录进度
+            result = self.transcribe_with_progress(audio)
+
+        srt = self.format_as_srt(self.to_original_timeline(result['segments']))
+        srt_path = cache.store(self.cache_key, srt)
+        cache.clear_checkpoint(self.cache_key)
+
+        self.on_progress(100)  # 字幕生成完成
+        return srt_path
+
+    def decode_options(self) -> Dict[str, Any]:
+        # 各识别引擎通用的解码参数
+        return {"language": self.LANGUAGE, "task": "transcribe"}
+
+    def to_original_timeline(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.timeline.map_segments(segments) if self.timeline else segments
+
+    def report_segments(self, segments: List[Dict[str, Any]], fraction: float, base_progress: int) -> None:
+        # 进度按实际已处理的音频时长计算，最高到 95%，剩余部分用于写出字幕文件
+        if segments:
+            segments = self.to_original_timeline(segments)
+            self.segments.extend(segments)
+            self.on_segments(segments)
+        self.on_progress(int(base_progress + fraction * (95 - base_progress)))
+
+    def save_chunk(self, index: int, segments: List[Dict[str, Any]]) -> None:
+        get_transcript_cache().append_checkpoint(self.cache_key, index, segments)
+
+    def transcribe_with_progress(self, audio: np.ndarray) -> Dict[str, List[Dict[str, Any]]]:
+        # 音频已在内存中，逐块解码并实时推送片段
+        segments = transcribe_serial(self.backend, audio, self.decode_options(),
+                                     lambda new, fraction: self.report_segments(new, fraction, 40),
+                                     finished_chunks=self.finished_chunks,
+                                     on_chunk=self.save_chunk,
+                                     should_stop=self.should_stop)
+        return {"segments": segments}
+
+    def transcribe_parallel(self, audio: np.ndarray) -> Dict[str, List[Dict[str, Any]]]:
+        backend_spec = self.backend.spec()
+        niceness = 0
+        if self.low_priority:
+            backend_spec["num_threads"] = max(1, (os.cpu_count() or 1) // 2 // self.workers)
+            niceness = LOW_PRIORITY_NICE
+        segments = transcribe_parallel(audio, backend_spec, self.decode_options(), self.workers,
+                                       lambda new, fraction: self.report_segments(new, fraction, 30),
+                                       finished_chunks=self.finished_chunks,
+                                       on_chunk=self.save_chunk,
+                                       should_stop=self.should_stop,
+                                       niceness=niceness)
+        return {"segments": segments}
+
 
 class SubtitleThread(QThread):
     finished_signal = pyqtSignal(str)
     progress_signal = pyqtSignal(int)
+    error_signal = pyqtSignal(str)
+    segments_signal = pyqtSignal(list)  # 解码过程中按顺序推送新完成的字幕片段
+    cancelled_signal = pyqtSignal()
 
-    TEMP_AUDIO_PATH = "temp_audio.mp3"
-    SRT_PATH = "subtitles.srt"
-
-    def __init__(self, video_path: str, model_name: str, parent: Any = None):
+    def __init__(self, video_path: str, model_name: str, workers: int = 1, parent: Any = None,
+                 backend: str = "openai-whisper", compute_type: str = "default", num_threads: int = 0,
+                 vad: bool = False):
         super().__init__(parent)
         self.video_path = video_path
         self.model_name = model_name
+        self.pipeline = SubtitlePipeline(video_path, model_name, workers, backend, compute_type, num_threads, vad)
+        self.pipeline.on_progress = self.progress_signal.emit
+        self.pipeline.on_segments = self.segments_signal.emit
+        self.pipeline.should_stop = self.isInterruptionRequested
 
-    def extract_audio(self) -> str:
-        command = ["ffmpeg", "-i", self.video_path, "-q:a", "0", "-map", "a", "-y", self.TEMP_AUDIO_PATH]
-        try:
-            subprocess.run(command, check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error extracting audio: {e}")
-            return ""
-        return self.TEMP_AUDIO_PATH
-
-    def format_as_srt(self, transcription_segments: List[Dict[str, Any]]) -> str:
-        srt_output = ""
-        for i, segment in enumerate(transcription_segments, 1):
-            start = self.format_time(segment['start'])
-            end = self.format_time(segment['end'])
-            text = segment['text']
-            srt_output += f"{i}\n{start} --> {end}\n{text}\n\n"
-        return srt_output
-
-    def format_time(self, seconds: float) -> str:
-        ms = int((seconds % 1) * 1000)
-        s = int(seconds)
-        h, s = divmod(s, 3600)
-        m, s = divmod(s, 60)
-        return f"{h:02}:{m:02}:{s:02},{ms:03}"
+    @property
+    def segments(self) -> List[Dict[str, Any]]:
+        return self.pipeline.segments
+
+    def format_as_srt(self, transcription_segments: List[Dict[str, Any]], start_index: int = 1) -> str:
+        return self.pipeline.format_as_srt(transcription_segments, start_index)
+
+    def cache_params(self) -> Dict[str, Any]:
+        return self.pipeline.cache_params()
+
+    def matches(self, other: "SubtitleThread") -> bool:
+        # 同一视频且影响结果的参数一致时，两个任务的产出相同，可以互相复用
+        return self.video_path == other.video_path and self.cache_params() == other.cache_params()
+
+    def lookup_cached(self) -> str:
+        return self.pipeline.lookup_cached()
 
     def run(self) -> None:
-        self.progress_signal.emit(10)  # 开始提取音频
-        audio_path = self.extract_audio()
-        self.progress_signal.emit(30)  # 音频提取完成
-
-        model = whisper.load_model(self.model_name)
-        self.progress_signal.emit(40)  # 模型加载完成
-
-        # 使用自定义的回调函数来获取转录进度
-        result = self.transcribe_with_progress(model, audio_path)
-        
-        srt = self.format_as_srt(result['segments'])
-
-        with open(self.SRT_PATH, "w", encoding="utf-8") as file:
-            file.write(srt)
-        
-        self.progress_signal.emit(100)  # 字幕生成完成
-        self.finished_signal.emit(self.SRT_PATH)
-
-    def transcribe_with_progress(self, model: Any, audio_path: str) -> Dict[str, List[Dict[str, Any]]]:
-        # 加载音频
-        audio = whisper.load_audio(audio_path)
-        audio = whisper.pad_or_trim(audio)
-        
-        # 获取音频特征
-        mel = whisper.log_mel_spectrogram(audio).to(model.device)
-        
-        # 进行解码
-        options = whisper.DecodingOptions(language="zh", task="transcribe")
-        result = model.transcribe(audio_path, **options.__dict__)
-        
-        segments = []
-        for i, segment in enumerate(result['segments']):
-            segments.append(segment)
-            progress = int(40 + (i + 1) / len(result['segments']) * 40)  # 40% to 80%
-            self.progress_signal.emit(progress)
-        
-        return {"segments": segments}
+        try:
+            srt_path = self.pipeline.run()
+        except (AudioDecodeError, RuntimeError) as e:
+            # 音频提取失败，或识别引擎加载、运行失败(例如未安装 faster-whisper)
+            print(e)
+            self.error_signal.emit(str(e))
+            return
+        except TranscriptionCancelled:
+            # 已完成的分块保留在断点文件中，下次生成时继续
+            self.cancelled_signal.emit()
+            return
+        self.finished_signal.emit(srt_path)
 
     def prompt_user_correction(self, text: str) -> None:
         # 这里可以实现提示用户校正的逻辑
         print(f"请校正以下文本: {text}")
 
-    def terminate(self):
+    def cancel(self) -> None:
+        # 协作式取消：当前分块完成后停止，不强制结束线程
         self.requestInterruption()
-        super().terminate()
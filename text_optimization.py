@@ -1,4 +1,3 @@
-import re
 import threading
 from PyQt5.QtCore import QObject, pyqtSignal, QMetaObject, Qt, Q_ARG, pyqtSlot
 from PyQt5.QtWidgets import QProgressDialog, QMessageBox, QApplication
@@ -13,7 +12,17 @@ import langchain
 from langchain.schema import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough, Runnable, RunnableConfig
 from langchain_community.cache import InMemoryCache
-from typing import Any, Dict, Optional, List
+from typing import Any, Callable, Dict, Optional, List
+from cues import strip_cue_markup
+from image_store import image_html
+
+
+# 各API提供商对应的密钥环境变量
+API_KEY_ENV_VARS = {
+    "OpenAI": "OPENAI_API_KEY",
+    "Groq": "GROQ_API_KEY",
+    "Claude": "ANTHROPIC_API_KEY",
+}
 
 
 class CustomInMemoryCache(InMemoryCache):
@@ -131,48 +140,56 @@ class TextOptimizer(QObject):
 
     def _optimize_text_thread(self, segments: List[Dict[str, Any]]) -> None:
         try:
-            optimized_segments = []
-            summaries = []
-            for i, segment in enumerate(segments):
-                if self.is_cancelled:
-                    QMetaObject.invokeMethod(self.progress_dialog, "close", Qt.QueuedConnection)
-                    return
-
-                print(segment)
-                if segment['type'] == 'text':
-                    text_to_optimize = re.sub(r'\d+\n\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}\n', '', segment['content'])
-                    
-                    # 优化文本
-                    optimized_text = self.optimize_chain.invoke({"text": text_to_optimize})
-                    optimized_segments.append(optimized_text.strip())
-                    
-                    # 生成摘要
-                    summary = self.summary_chain.invoke({"optimized_text": optimized_text})
-                    summaries.append(summary)
-                    
-                elif segment['type'] == 'image':
-                    optimized_segments.append(segment['content'])
-
-                # 更新进度
-                progress = min(99, int(100 * (i + 1) / len(segments)))
-                self.progress_updated.emit(progress)
-
-            if self.is_cancelled:
+            final_content = self.optimize_segments(segments, self.progress_updated.emit, lambda: self.is_cancelled)
+            if final_content is None:
                 QMetaObject.invokeMethod(self.progress_dialog, "close", Qt.QueuedConnection)
                 return
 
-            # 生成文章导读
-            all_summaries = "\n".join(summaries)
-            intro = self.generate_intro(all_summaries)
-            
-            # 将导读放在优化后的文本之前
-            final_content = f"导读：\n{intro}\n\n" + "\n\n".join(optimized_segments)
-
             self.optimization_finished.emit(final_content)
             QMetaObject.invokeMethod(self.progress_dialog, "close", Qt.QueuedConnection)
         except Exception as e:
             self.error_occurred.emit(str(e))
 
+    def optimize_segments(self, segments: List[Dict[str, Any]],
+                          on_progress: Optional[Callable[[int], None]] = None,
+                          should_stop: Optional[Callable[[], bool]] = None) -> Optional[str]:
+        # 不依赖界面的书面化流程，批处理服务也直接调用；取消时返回 None
+        optimized_segments = []
+        summaries = []
+        for i, segment in enumerate(segments):
+            if should_stop and should_stop():
+                return None
+
+            print(segment)
+            if segment['type'] == 'text':
+                text_to_optimize = strip_cue_markup(segment['content'])
+                
+                # 优化文本
+                optimized_text = self.optimize_chain.invoke({"text": text_to_optimize})
+                optimized_segments.append(optimized_text.strip())
+                
+                # 生成摘要
+                summary = self.summary_chain.invoke({"optimized_text": optimized_text})
+                summaries.append(summary)
+                
+            elif segment['type'] == 'image':
+                optimized_segments.append(image_html(segment['image'], segment.get('width', 0),
+                                                     segment.get('height', 0)))
+
+            # 更新进度
+            if on_progress:
+                on_progress(min(99, int(100 * (i + 1) / len(segments))))
+
+        if should_stop and should_stop():
+            return None
+
+        # 生成文章导读
+        all_summaries = "\n".join(summaries)
+        intro = self.generate_intro(all_summaries)
+        
+        # 将导读放在优化后的文本之前
+        return f"导读：\n{intro}\n\n" + "\n\n".join(optimized_segments)
+
     @pyqtSlot(str)
     def show_error_and_close_dialog(self, error_message: str) -> None:
         QMessageBox.critical(None, "错误", f"优化过程中发生错误:\n{error_message}")
@@ -0,0 +1,158 @@
+# transcript_cache.py
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from disk_cache import DiskLRUCache, cache_root, file_identity
+
+DEFAULT_MAX_MB = 200
+
+
+def hash_audio_stream(media_path: str) -> Optional[str]:
+    # 直接对音频流的压缩数据包做哈希，无需解码，同一音频换了文件名或容器也能命中
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", media_path,
+               "-map", "0:a:0", "-c", "copy", "-f", "hash", "-hash", "sha256", "-"]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Error hashing audio stream: {e}")
+        return None
+    _, _, digest = output.strip().partition("=")
+    return digest or None
+
+
+class TranscriptCache:
+    def __init__(self, directory: Optional[str] = None, max_mb: Optional[int] = None):
+        if directory is None:
+            directory = os.path.join(cache_root(), "transcripts")
+        if max_mb is None:
+            max_mb = int(os.getenv("VFP_TRANSCRIPT_CACHE_MB", DEFAULT_MAX_MB))
+        self.store_cache = DiskLRUCache(directory, max_mb * 1024 * 1024)
+        self.checkpoint_dir = os.path.join(cache_root(), "checkpoints")
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # 文件路径/大小/修改时间 -> 音频哈希，重复打开同一文件时无需再读取整个文件
+        self.fingerprints_path = os.path.join(cache_root(), "audio_fingerprints.json")
+        self._lock = threading.Lock()
+        self._fingerprints = self._load_fingerprints()
+
+    def _load_fingerprints(self) -> Dict[str, str]:
+        try:
+            with open(self.fingerprints_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_fingerprints(self) -> None:
+        # 界面和批处理的各工作进程各自持有缓存，先合并磁盘上其他进程写入的条目，
+        # 再写入唯一命名的临时文件后原子替换，避免互相截断或覆盖
+        self._fingerprints = {**self._load_fingerprints(), **self._fingerprints}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.fingerprints_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self._fingerprints, file)
+            os.replace(tmp_path, self.fingerprints_path)
+        except OSError as e:
+            # 指纹只是加速手段，写入失败不影响转写
+            print(f"Error saving audio fingerprints: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def cached_fingerprint(self, media_path: str) -> Optional[str]:
+        try:
+            identity = file_identity(media_path)
+        except OSError:
+            return None
+        with self._lock:
+            return self._fingerprints.get(identity)
+
+    def fingerprint(self, media_path: str) -> str:
+        identity = file_identity(media_path)
+        with self._lock:
+            digest = self._fingerprints.get(identity)
+        if digest:
+            return digest
+        # 无法读取音频流时退化为按文件身份缓存
+        digest = hash_audio_stream(media_path) or hashlib.sha256(identity.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._fingerprints[identity] = digest
+            self._save_fingerprints()
+        return digest
+
+    def make_key(self, audio_hash: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"audio": audio_hash, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        return self.store_cache.get_path(f"{key}.srt")
+
+    def lookup_media(self, media_path: str, params: Dict[str, Any]) -> Optional[str]:
+        # 只使用已记录的指纹，不做任何耗时操作，可以在界面线程中调用
+        audio_hash = self.cached_fingerprint(media_path)
+        if audio_hash is None:
+            return None
+        return self.lookup(self.make_key(audio_hash, params))
+
+    def store(self, key: str, srt: str) -> str:
+        return self.store_cache.put_bytes(f"{key}.srt", srt.encode("utf-8"))
+
+    # ---- 断点续转 ----
+    # 断点文件为追加写入的 JSON Lines：首行记录分块窗口，之后每行一个已完成的分块
+
+    def checkpoint_path(self, key: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{key}.jsonl")
+
+    def load_checkpoint(self, key: str, windows: List[Tuple[int, int]]) -> Dict[int, List[Dict[str, Any]]]:
+        chunks: Dict[int, List[Dict[str, Any]]] = {}
+        try:
+            with open(self.checkpoint_path(key), "r", encoding="utf-8") as file:
+                header = json.loads(file.readline() or "{}")
+                if [tuple(w) for w in header.get("windows", [])] != list(windows):
+                    return {}  # 分块方式已变化，断点无法复用
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时写了一半的行
+                    chunks[record["window"]] = record["segments"]
+        except (FileNotFoundError, ValueError):
+            return {}
+        return chunks
+
+    def start_checkpoint(self, key: str, windows: List[Tuple[int, int]]) -> Dict[int, List[Dict[str, Any]]]:
+        # 读取可复用的分块后重写断点文件，去掉崩溃时残留的半行，返回已完成的分块
+        chunks = self.load_checkpoint(key, windows)
+        with open(self.checkpoint_path(key), "w", encoding="utf-8") as file:
+            file.write(json.dumps({"windows": windows}) + "\n")
+            for window in sorted(chunks):
+                file.write(json.dumps({"window": window, "segments": chunks[window]}, ensure_ascii=False) + "\n")
+        return chunks
+
+    def append_checkpoint(self, key: str, window: int, segments: List[Dict[str, Any]]) -> None:
+        with open(self.checkpoint_path(key), "a", encoding="utf-8") as file:
+            file.write(json.dumps({"window": window, "segments": segments}, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def clear_checkpoint(self, key: str) -> None:
+        try:
+            os.remove(self.checkpoint_path(key))
+        except FileNotFoundError:
+            pass
+
+
+_transcript_cache: Optional[TranscriptCache] = None
+_transcript_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _transcript_cache
+    with _transcript_cache_lock:
+        if _transcript_cache is None:
+            _transcript_cache = TranscriptCache()
+        return _transcript_cache
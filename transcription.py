@@ -0,0 +1,215 @@
+# transcription.py
+import os
+import re
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from asr_backends import ASRBackend, create_backend
+from audio import SAMPLE_RATE
+
+CHUNK_SECONDS = 120  # 每个分块的时长
+OVERLAP_SECONDS = 4  # 相邻分块的重叠时长，避免在词语中间切断
+LOW_PRIORITY_NICE = 19  # 后台预生成使用的 nice 值
+
+Segment = Dict[str, Any]
+
+
+def split_windows(num_samples: int, sample_rate: int = SAMPLE_RATE,
+                  chunk_seconds: float = CHUNK_SECONDS,
+                  overlap_seconds: float = OVERLAP_SECONDS) -> List[Tuple[int, int]]:
+    # 将音频切分为有重叠的窗口，返回 (起始采样点, 结束采样点)
+    chunk = int(chunk_seconds * sample_rate)
+    step = chunk - int(overlap_seconds * sample_rate)
+    windows = []
+    start = 0
+    while True:
+        end = min(start + chunk, num_samples)
+        windows.append((start, end))
+        if end >= num_samples:
+            break
+        start += step
+    return windows
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r'[\s\W_]+', '', text).lower()
+
+
+class SegmentStitcher:
+    # 按窗口顺序拼接分块结果：时间戳加上窗口偏移，重叠区以中点为界，
+    # 并丢弃与上一条文本相同的重复片段。乱序到达的分块会先缓存。
+    def __init__(self, windows: List[Tuple[int, int]], sample_rate: int = SAMPLE_RATE):
+        self.offsets = [start / sample_rate for start, _ in windows]
+        # 第 i 个窗口负责 [cuts[i], cuts[i + 1]) 区间内开始的片段
+        self.cuts = [0.0]
+        for (_, prev_end), (next_start, _) in zip(windows, windows[1:]):
+            self.cuts.append((prev_end + next_start) / 2 / sample_rate)
+        self.cuts.append(float('inf'))
+        self.segments: List[Segment] = []
+        self._pending: Dict[int, List[Segment]] = {}
+        self._next_index = 0
+
+    @property
+    def done(self) -> bool:
+        return self._next_index >= len(self.offsets)
+
+    def add(self, index: int, chunk_segments: List[Segment]) -> List[Segment]:
+        self._pending[index] = chunk_segments
+        emitted = []
+        while self._next_index in self._pending:
+            i = self._next_index
+            emitted.extend(self._stitch(i, self._pending.pop(i)))
+            self._next_index += 1
+        return emitted
+
+    def _stitch(self, index: int, chunk_segments: List[Segment]) -> List[Segment]:
+        offset = self.offsets[index]
+        lower, upper = self.cuts[index], self.cuts[index + 1]
+        emitted = []
+        for segment in chunk_segments:
+            start = segment['start'] + offset
+            end = segment['end'] + offset
+            if not lower <= start < upper:
+                continue
+            text = segment['text']
+            if self.segments:
+                last = self.segments[-1]
+                if _normalize_text(text) == _normalize_text(last['text']) and start - last['end'] < OVERLAP_SECONDS:
+                    continue
+                start = max(start, last['end'])
+            stitched = {'id': len(self.segments), 'start': start, 'end': max(end, start), 'text': text}
+            self.segments.append(stitched)
+            emitted.append(stitched)
+        return emitted
+
+
+def transcribe_chunk(backend: ASRBackend, audio: np.ndarray, decode_options: Dict[str, Any]) -> List[Segment]:
+    # 各引擎只返回拼接和生成SRT所需的字段，减少进程间传输
+    return backend.transcribe(audio, **decode_options)
+
+
+class TranscriptionCancelled(Exception):
+    pass
+
+
+ChunkCallback = Callable[[int, List[Segment]], None]
+SegmentsCallback = Callable[[List[Segment], float], None]
+
+
+def transcribe_serial(backend: ASRBackend, audio: np.ndarray, decode_options: Dict[str, Any],
+                      on_segments: Optional[SegmentsCallback] = None,
+                      finished_chunks: Optional[Dict[int, List[Segment]]] = None,
+                      on_chunk: Optional[ChunkCallback] = None,
+                      should_stop: Optional[Callable[[], bool]] = None) -> List[Segment]:
+    # 逐块转写，每完成一块立即上报新片段和已处理的音频比例；
+    # 上一块末尾的文本作为下一块的提示词，保持上下文连贯。
+    # finished_chunks 为断点中已完成的分块，直接复用；每块之间检查是否需要停止
+    windows = split_windows(len(audio))
+    stitcher = SegmentStitcher(windows)
+    finished_chunks = finished_chunks or {}
+    for index, (start, end) in enumerate(windows):
+        if index in finished_chunks:
+            chunk_segments = finished_chunks[index]
+        else:
+            if should_stop and should_stop():
+                raise TranscriptionCancelled()
+            options = dict(decode_options)
+            if stitcher.segments:
+                options['initial_prompt'] = "".join(s['text'] for s in stitcher.segments[-3:])
+            chunk_segments = transcribe_chunk(backend, audio[start:end], options)
+            if on_chunk:
+                on_chunk(index, chunk_segments)
+        emitted = stitcher.add(index, chunk_segments)
+        if on_segments:
+            on_segments(emitted, end / len(audio))
+    return stitcher.segments
+
+
+def lower_priority(niceness: int = LOW_PRIORITY_NICE) -> None:
+    # Linux 上 nice 值按线程生效：只影响调用线程，以及之后由它创建的线程和子进程(ffmpeg、工作进程)。
+    # QThread 的优先级在 Linux 上不起作用，后台任务需要在实际运行的线程和进程中降低优先级
+    if not hasattr(os, "setpriority"):
+        return  # Windows 上只能依赖 QThread.IdlePriority
+    try:
+        if os.getpriority(os.PRIO_PROCESS, 0) < niceness:
+            os.setpriority(os.PRIO_PROCESS, 0, niceness)
+    except OSError as e:
+        print(f"无法降低优先级: {e}")
+
+
+# ---- 进程池工作进程 ----
+_worker_backend: Optional[ASRBackend] = None
+
+
+def _init_worker(backend_spec: Dict[str, Any], niceness: int = 0) -> None:
+    global _worker_backend
+    if niceness:
+        # 在加载模型前设置，torch/CTranslate2 创建的计算线程随之继承
+        lower_priority(niceness)
+    _worker_backend = create_backend(**backend_spec)
+    _worker_backend.model()  # 每个工作进程持有自己的模型
+
+
+def _transcribe_in_worker(index: int, audio: np.ndarray, decode_options: Dict[str, Any]) -> Tuple[int, List[Segment]]:
+    return index, transcribe_chunk(_worker_backend, audio, decode_options)
+
+
+def transcribe_parallel(audio: np.ndarray, backend_spec: Dict[str, Any], decode_options: Dict[str, Any],
+                        workers: int,
+                        on_segments: Optional[SegmentsCallback] = None,
+                        finished_chunks: Optional[Dict[int, List[Segment]]] = None,
+                        on_chunk: Optional[ChunkCallback] = None,
+                        should_stop: Optional[Callable[[], bool]] = None,
+                        niceness: int = 0) -> List[Segment]:
+    # 多进程并行转写各窗口，按顺序拼接；on_segments(新片段, 完成比例) 用于上报进度。
+    # niceness 不为 0 时工作进程以该 nice 值运行
+    windows = split_windows(len(audio))
+    stitcher = SegmentStitcher(windows)
+    finished_chunks = finished_chunks or {}
+    completed = 0
+    for index in sorted(finished_chunks):
+        completed += 1
+        emitted = stitcher.add(index, finished_chunks[index])
+        if on_segments:
+            on_segments(emitted, completed / len(windows))
+    remaining = [i for i in range(len(windows)) if i not in finished_chunks]
+    if not remaining:
+        return stitcher.segments
+
+    workers = max(1, min(workers, len(remaining)))
+    backend_spec = dict(backend_spec)
+    if not backend_spec.get("num_threads"):
+        # 未指定线程数时各进程平分 CPU 核心
+        backend_spec["num_threads"] = max(1, (os.cpu_count() or 1) // workers)
+    # 使用 spawn 避免在已启动 torch/Qt 线程的进程中 fork
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(backend_spec, niceness))
+    try:
+        # 按需提交分块，最多同时排队 2 倍进程数，避免一次性复制整段音频
+        pending = set()
+        while completed < len(windows):
+            if should_stop and should_stop():
+                raise TranscriptionCancelled()
+            while remaining and len(pending) < workers * 2:
+                index = remaining.pop(0)
+                start, end = windows[index]
+                pending.add(executor.submit(_transcribe_in_worker, index,
+                                            np.array(audio[start:end]), decode_options))
+            # 定时醒来检查取消请求
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, chunk_segments = future.result()
+                completed += 1
+                if on_chunk:
+                    on_chunk(index, chunk_segments)
+                emitted = stitcher.add(index, chunk_segments)
+                if on_segments:
+                    on_segments(emitted, completed / len(windows))
+    finally:
+        # 取消时不等待正在运行的分块，排队中的分块直接丢弃
+        executor.shutdown(wait=False, cancel_futures=True)
+    return stitcher.segments
@@ -1,24 +1,30 @@
 # ui.py
-from PyQt5.QtCore import (QByteArray, QBuffer, QIODevice, QMimeData, QSize, QTimer, Qt, pyqtSignal, 
+from PyQt5.QtCore import (QMimeData, QSize, Qt, pyqtSignal, 
                           QThread, QMetaObject, Q_ARG, pyqtSlot, QPoint, QRect)  # 添加这一行以导入 QRect
-from PyQt5.QtGui import (QColor, QClipboard, QImage, QIcon, QPainter, QPixmap, QTextCharFormat, QTextCursor, QBrush, QFont)
-from PyQt5.QtWidgets import (QApplication, QDialog, QHBoxLayout, QLabel, QLineEdit, QListWidget, 
-                             QListWidgetItem, QMainWindow, QMessageBox, QPushButton, QProgressDialog, QSlider, 
+from PyQt5.QtGui import (QColor, QClipboard, QIcon, QPainter, QTextCursor, QBrush, QFont)
+from PyQt5.QtWidgets import (QApplication, QDialog, QHBoxLayout, QLabel, QLineEdit, 
+                             QMainWindow, QMessageBox, QPushButton, QProgressDialog, QSlider, 
                              QTextEdit, QVBoxLayout, QWidget, QFileDialog, QComboBox, QGroupBox, 
-                             QSplitter, QFrame)
+                             QSplitter, QFrame, QSpinBox, QCheckBox, QInputDialog)
 
 from video_player import VideoPlayer as VLCVideoPlayer
 from rich_text_editor import RichTextEditor
 from optimized_text_window import OptimizedTextWindow
 from subtitles import SubtitleThread
-from text_optimization import TextOptimizer
-from utils import parse_srt_time_range, convert_srt_time_to_milliseconds
+from asr_backends import BACKENDS, create_backend
+from text_optimization import API_KEY_ENV_VARS, TextOptimizer
+from job_server import JobQueue
+from job_window import JobListDialog
+from cue_index import CueIndex
+from pdf_view import PdfSlideList
+from slide_align import CUE_SNAP_MS, DEFAULT_SAMPLE_FPS, SlideAlignThread
+from cues import CueList
+from autosave import AutosaveJournal
+from project import PROJECT_SUFFIX, Project, ProjectError, load_project, save_project
 from bs4 import BeautifulSoup
 import re
 import os
-import fitz
 from io import BytesIO
-import base64
 from PIL import Image
 from datetime import datetime
 from dotenv import load_dotenv
@@ -31,6 +37,15 @@ class VideoPlayer(QMainWindow):
         super().__init__()
         self.video_player = VLCVideoPlayer()
         self.init_ui()
+
+        # 自动保存编辑内容，上次异常退出时询问是否恢复
+        self.autosave = AutosaveJournal(self.text_edit, self.text_edit.image_store)
+        if self.autosave.has_recovery():
+            answer = QMessageBox.question(self, "恢复", "检测到上次未正常退出时的编辑内容，是否恢复？",
+                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if answer == QMessageBox.Yes:
+                self.autosave.recover()
+        self.autosave.start()
         
         # 设置复读按钮为浮动窗口
         self.repeat_button.setAttribute(Qt.WA_TranslucentBackground)
@@ -82,15 +97,16 @@ class VideoPlayer(QMainWindow):
         video_layout.addWidget(self.video_frame)
 
         self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, 1000)  # VideoPlayer.set_position 按千分比定位
         self.slider.sliderPressed.connect(self.slider_pressed)
         self.slider.sliderReleased.connect(self.slider_released)
         self.slider.sliderMoved.connect(self.set_position)
         video_layout.addWidget(self.slider)
 
         control_layout = QHBoxLayout()
-        self.play_button = self.create_button("播放", self.video_player.player.play, "icons/play.png")
-        self.pause_button = self.create_button("暂停", self.video_player.player.pause, "icons/pause.png")
-        self.stop_button = self.create_button("停止", self.video_player.player.stop, "icons/stop.png")
+        self.play_button = self.create_button("播放", self.video_player.play, "icons/play.png")
+        self.pause_button = self.create_button("暂停", self.video_player.pause, "icons/pause.png")
+        self.stop_button = self.create_button("停止", self.video_player.stop, "icons/stop.png")
         control_layout.addWidget(self.play_button)
         control_layout.addWidget(self.pause_button)
         control_layout.addWidget(self.stop_button)
@@ -106,21 +122,76 @@ class VideoPlayer(QMainWindow):
         self.model_combo_box = QComboBox()
         self.model_combo_box.addItems(["tiny", "base", "small", "medium", "large"])
         self.model_combo_box.setCurrentText("small")  # 默认选择 small 模型
+        self.model_combo_box.currentTextChanged.connect(self.on_model_changed)
         model_layout.addWidget(model_label)
         model_layout.addWidget(self.model_combo_box)
         subtitle_layout.addLayout(model_layout)
 
+        backend_layout = QHBoxLayout()
+        self.backend_combo_box = QComboBox()
+        self.backend_combo_box.addItems(list(BACKENDS))
+        self.backend_combo_box.setToolTip("openai-whisper: 参考实现\nfaster-whisper: CTranslate2 引擎，int8 量化后适合纯 CPU 机器")
+        self.backend_combo_box.currentTextChanged.connect(self.on_backend_changed)
+        self.compute_type_combo_box = QComboBox()
+        self.threads_spin_box = QSpinBox()
+        self.threads_spin_box.setRange(0, os.cpu_count() or 1)
+        self.threads_spin_box.setSpecialValueText("自动")
+        self.threads_spin_box.setToolTip("识别引擎使用的 CPU 线程数")
+        backend_layout.addWidget(QLabel("识别引擎:"))
+        backend_layout.addWidget(self.backend_combo_box)
+        backend_layout.addWidget(QLabel("计算类型:"))
+        backend_layout.addWidget(self.compute_type_combo_box)
+        backend_layout.addWidget(QLabel("线程数:"))
+        backend_layout.addWidget(self.threads_spin_box)
+        subtitle_layout.addLayout(backend_layout)
+        self.populate_compute_types(self.backend_combo_box.currentText())
+        self.compute_type_combo_box.currentTextChanged.connect(self.on_model_changed)
+
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("并行进程数:")
+        self.workers_spin_box = QSpinBox()
+        self.workers_spin_box.setRange(1, os.cpu_count() or 1)
+        self.workers_spin_box.setValue(1)
+        self.workers_spin_box.setToolTip("大于 1 时将音频分块并行转写，每个进程各自加载一份模型")
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_spin_box)
+        self.vad_checkbox = QCheckBox("跳过静音")
+        self.vad_checkbox.setToolTip("转写前检测语音区，只识别有人说话的部分，减少静音、掌声上的计算和幻觉文本")
+        self.vad_checkbox.toggled.connect(self.start_speculative_subtitles)
+        workers_layout.addWidget(self.vad_checkbox)
+        subtitle_layout.addLayout(workers_layout)
+
+        self.speculative_checkbox = QCheckBox("加载视频后在后台预生成字幕")
+        self.speculative_checkbox.setToolTip("以低优先级提前转写，点击生成字幕时往往已经完成")
+        self.speculative_checkbox.toggled.connect(self.on_speculative_toggled)
+        subtitle_layout.addWidget(self.speculative_checkbox)
+
         self.generate_subtitles_button = self.create_button("生成字幕", self.generate_subtitles, "icons/subtitles.png")
         subtitle_layout.addWidget(self.generate_subtitles_button)
+
+        batch_layout = QHBoxLayout()
+        self.submit_jobs_button = self.create_button("提交到批处理队列", self.submit_batch_jobs)
+        self.submit_jobs_button.setToolTip("选择多个视频，由后台批处理服务(python job_server.py serve)依次生成字幕")
+        batch_layout.addWidget(self.submit_jobs_button)
+        self.show_jobs_button = self.create_button("批处理任务", self.show_batch_jobs)
+        batch_layout.addWidget(self.show_jobs_button)
+        subtitle_layout.addLayout(batch_layout)
         left_layout.addWidget(subtitle_group)
 
         pdf_group = QGroupBox("PDF控制")
         pdf_layout = QVBoxLayout(pdf_group)
         self.load_pdf_button = self.create_button("加载演示PDF", self.load_pdf, "icons/load_pdf.png")
         pdf_layout.addWidget(self.load_pdf_button)
-        self.pdf_list_widget = QListWidget()
+        self.prerender_pdf_button = self.create_button("预渲染全部页面", self.prerender_pdf)
+        self.prerender_pdf_button.setToolTip("用多个进程按指定分辨率渲染全部页面并缓存，之后插入幻灯片时直接读取")
+        self.prerender_pdf_button.setEnabled(False)
+        pdf_layout.addWidget(self.prerender_pdf_button)
+        self.align_slides_button = self.create_button("自动插入幻灯片", self.auto_insert_slides)
+        self.align_slides_button.setToolTip("根据视频画面匹配PDF页面，在幻灯片切换处的字幕前插入对应页面")
+        pdf_layout.addWidget(self.align_slides_button)
+        self.pdf_list_widget = PdfSlideList()
         self.pdf_list_widget.setVisible(False)
-        self.pdf_list_widget.itemDoubleClicked.connect(self.insert_image)
+        self.pdf_list_widget.page_activated.connect(self.insert_image)
         pdf_layout.addWidget(self.pdf_list_widget)
         left_layout.addWidget(pdf_group)
 
@@ -132,6 +203,9 @@ class VideoPlayer(QMainWindow):
         editor_layout = QVBoxLayout(editor_group)
         
         self.text_edit = RichTextEditor(self)        
+        self.cue_index = CueIndex(self.text_edit.document())  # 播放时按时间查找字幕行
+        self.text_edit.toolbar.addAction(QIcon("icons/open.png"), "打开项目", self.open_project)
+        self.text_edit.toolbar.addAction(QIcon("icons/save.png"), "保存项目", self.save_project)
         self.text_edit.set_mouse_move_event(self.mouseMoveEvent)  # 设置鼠标移动事件
         editor_layout.addWidget(self.text_edit)  # 添加到布局中
         
@@ -177,12 +251,15 @@ class VideoPlayer(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
         
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_subtitles)
-        self.timer.start(100)
+        # 播放进度由播放器事件驱动，暂停时不占用 CPU
+        self.video_player.position_changed.connect(self.update_playback_position)
+        self.video_player.segment_finished.connect(self.on_playback_finished)
 
         self.last_highlighted_line = -1
         self.is_slider_being_dragged = False
+        self.pdf_path = ""
+        self.align_thread = None
+        self.optimized_results = []  # 本项目的书面化结果，随项目一起保存
 
         self.model_combo_box.setToolTip(
             "tiny: 最快,质量最低\n"
@@ -221,127 +298,320 @@ class VideoPlayer(QMainWindow):
 
     @pyqtSlot(str)
     def on_progress_dialog_closed(self, optimized_text):
-        self.optimized_window = OptimizedTextWindow(optimized_text)
+        self.optimized_results.append(optimized_text)
+        self.optimized_window = OptimizedTextWindow(optimized_text, self.text_edit.image_store)
         self.optimized_window.show()
 
     def slider_pressed(self):
         self.is_slider_being_dragged = True
 
     def slider_released(self):
-        new_position = self.slider.value() / self.slider.maximum()
-        self.video_player.setPosition(new_position)
+        self.video_player.set_position(self.slider.value())
         self.is_slider_being_dragged = False        
 
     def set_position(self, position):
-        self.video_player.setPosition(position)
+        self.video_player.set_position(position)
 
-    def update_slider(self):
-        self.video_player.updateSlider(self.slider, self.is_slider_being_dragged)  
+    def update_slider(self, fraction):
+        if not self.is_slider_being_dragged:
+            self.slider.setValue(int(fraction * self.slider.maximum()))
 
     def load_video(self):
         video_path, _ = QFileDialog.getOpenFileName(self, "Open Video", "", "Video Files (*.mp4)")
         if video_path:
             self.video_path = video_path
             self.video_player.play_video(video_path)
+            self.start_speculative_subtitles()
+
+    def job_queue(self):
+        if not hasattr(self, '_job_queue'):
+            self._job_queue = JobQueue()
+        return self._job_queue
+
+    def submit_batch_jobs(self):
+        video_paths, _ = QFileDialog.getOpenFileNames(self, "选择要批处理的视频", "", "Video Files (*.mp4)")
+        if not video_paths:
+            return
+        # API 密钥不写入任务数据库，由批处理服务从环境变量读取
+        options = dict(self.current_subtitle_options(), model=self.model_combo_box.currentText(),
+                       api_provider=self.api_provider_combo.currentText())
+        answer = QMessageBox.question(self, "批处理", "是否在生成字幕后同时进行书面化处理？",
+                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        options["optimize"] = answer == QMessageBox.Yes
+        queue = self.job_queue()
+        for video_path in video_paths:
+            queue.submit(video_path, options)
+        message = f"已提交 {len(video_paths)} 个批处理任务"
+        if not queue.server_alive():
+            message += "，批处理服务未运行，请执行 python job_server.py serve"
+        self.statusBar().showMessage(message, 5000)
+
+    def show_batch_jobs(self):
+        if not hasattr(self, 'job_dialog'):
+            self.job_dialog = JobListDialog(self.job_queue(), self)
+            self.job_dialog.subtitles_requested.connect(self.open_batch_subtitles)
+            self.job_dialog.document_requested.connect(self.open_batch_document)
+        self.job_dialog.refresh()
+        self.job_dialog.timer.start()
+        self.job_dialog.show()
+        self.job_dialog.raise_()
+
+    def open_batch_subtitles(self, video_path, srt_path):
+        if os.path.exists(video_path):
+            self.video_path = video_path
+            self.video_player.play_video(video_path)
+        self.load_srt(srt_path)
+
+    def open_batch_document(self, document_path):
+        with open(document_path, "r", encoding="utf-8") as file:
+            self.on_progress_dialog_closed(file.read())
+
+    def create_subtitle_thread(self):
+        # 以窗口为父对象，取消后线程仍在收尾时不会被提前销毁
+        return SubtitleThread(self.video_path, self.model_combo_box.currentText(),
+                              self.workers_spin_box.value(), self,
+                              **self.current_subtitle_options())
+
+    def start_subtitle_thread(self, subtitle_thread, attached):
+        # attached 为 False 时是后台预生成任务，不更新进度框和编辑框，直到用户点击生成字幕
+        if hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning():
+            self.subtitle_thread.cancel()
+        self.subtitle_thread = subtitle_thread
+        self.subtitle_thread_attached = attached
+        self.streamed_segment_count = 0
+        self.subtitle_thread.progress_signal.connect(self.update_subtitle_progress)
+        self.subtitle_thread.segments_signal.connect(self.on_subtitle_segments)
+        self.subtitle_thread.finished_signal.connect(self.on_subtitle_thread_finished)
+        self.subtitle_thread.error_signal.connect(self.on_subtitle_thread_error)
+        self.subtitle_thread.cancelled_signal.connect(self.on_subtitle_thread_cancelled)
+        # 后台任务在转写线程、ffmpeg 和工作进程中降低 nice 值并减少线程数；
+        # QThread 的优先级只在 Windows/macOS 上生效
+        self.subtitle_thread.pipeline.low_priority = not attached
+        self.subtitle_thread.start(QThread.NormalPriority if attached else QThread.IdlePriority)
+
+    def start_speculative_subtitles(self):
+        if not self.speculative_checkbox.isChecked() or not hasattr(self, 'video_path'):
+            return
+        if hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning() and self.subtitle_thread_attached:
+            return  # 不打断用户主动发起的生成
+        subtitle_thread = self.create_subtitle_thread()
+        if subtitle_thread.lookup_cached():
+            subtitle_thread.deleteLater()
+            # 新参数已有缓存，旧参数的预生成结果不会再用到
+            if (hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning()
+                    and not self.subtitle_thread.matches(subtitle_thread)):
+                self.subtitle_thread.cancel()
+            return
+        if (hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning()
+                and self.subtitle_thread.matches(subtitle_thread)):
+            subtitle_thread.deleteLater()
+            return  # 相同参数的预生成任务已在运行
+        self.start_subtitle_thread(subtitle_thread, attached=False)
+        self.statusBar().showMessage("正在后台预生成字幕...", 3000)
+
+    def on_speculative_toggled(self, checked):
+        if checked:
+            self.start_speculative_subtitles()
+        elif hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning() and not self.subtitle_thread_attached:
+            self.subtitle_thread.cancel()
+
+    def show_subtitle_progress_dialog(self):
+        # 创建并显示进度对话框
+        self.progress_dialog = QProgressDialog("正在生成字幕...", "取消", 0, 100, self)
+        # 非模态，生成过程中即可校正已推送的字幕
+        self.progress_dialog.setWindowModality(Qt.NonModal)
+        self.progress_dialog.setWindowTitle("生成字幕")
+        self.progress_dialog.setValue(0)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.canceled.connect(self.cancel_subtitle_generation)
+        self.progress_dialog.show()
 
     def generate_subtitles(self):
         if hasattr(self, 'video_path'):
-            # 创建并显示进度对话框
-            self.progress_dialog = QProgressDialog("正在生成字幕...", "取消", 0, 100, self)
-            self.progress_dialog.setWindowModality(Qt.WindowModal)
-            self.progress_dialog.setWindowTitle("生成字幕")
-            self.progress_dialog.setValue(0)
-            self.progress_dialog.setAutoClose(False)
-            self.progress_dialog.setAutoReset(False)
-            self.progress_dialog.canceled.connect(self.cancel_subtitle_generation)
-            self.progress_dialog.show()
-
-            selected_model = self.model_combo_box.currentText()
-            self.subtitle_thread = SubtitleThread(self.video_path, selected_model)
-            self.subtitle_thread.progress_signal.connect(self.update_subtitle_progress)
-            self.subtitle_thread.finished_signal.connect(self.on_subtitle_thread_finished)
-            self.subtitle_thread.start()
+            subtitle_thread = self.create_subtitle_thread()
+
+            # 已缓存的字幕直接加载，无需启动转写线程
+            cached_path = subtitle_thread.lookup_cached()
+            if cached_path:
+                subtitle_thread.deleteLater()
+                self.load_srt(cached_path)
+                return
+
+            self.show_subtitle_progress_dialog()
+
+            if (hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning()
+                    and not self.subtitle_thread_attached and self.subtitle_thread.matches(subtitle_thread)):
+                # 接管参数相同的后台预生成任务，先补齐已完成的片段
+                subtitle_thread.deleteLater()
+                self.subtitle_thread_attached = True
+                # 已降低的 nice 值无法在没有权限时恢复，接管后仍以较低优先级运行完
+                self.subtitle_thread.setPriority(QThread.NormalPriority)
+                self.append_subtitle_segments(list(self.subtitle_thread.segments))
+                return
+
+            self.start_subtitle_thread(subtitle_thread, attached=True)
+
+    def current_subtitle_options(self):
+        return {"backend": self.backend_combo_box.currentText(),
+                "compute_type": self.compute_type_combo_box.currentText(),
+                "num_threads": self.threads_spin_box.value(),
+                "vad": self.vad_checkbox.isChecked()}
+
+    def populate_compute_types(self, backend_name):
+        compute_types = BACKENDS[backend_name].compute_types
+        self.compute_type_combo_box.blockSignals(True)
+        self.compute_type_combo_box.clear()
+        self.compute_type_combo_box.addItems(compute_types)
+        self.compute_type_combo_box.setEnabled(len(compute_types) > 1)
+        self.compute_type_combo_box.blockSignals(False)
+
+    def on_backend_changed(self, backend_name):
+        self.populate_compute_types(backend_name)
+        self.on_model_changed()
+
+    def on_model_changed(self, *_):
+        # 切换模型或引擎时在后台预加载，点击生成字幕时无需再等待模型加载
+        options = self.current_subtitle_options()
+        create_backend(options["backend"], self.model_combo_box.currentText(),
+                       options["compute_type"], options["num_threads"]).warm_up()
+        # 参数变化后旧的预生成任务不再适用，取消后按新参数重新开始；已完成分块留在断点中可再复用
+        self.start_speculative_subtitles()
 
     def cancel_subtitle_generation(self):
+        # 请求线程在当前分块结束后停止，不阻塞界面等待；已完成的分块会写入断点
         if hasattr(self, 'subtitle_thread') and self.subtitle_thread.isRunning():
-            self.subtitle_thread.terminate()
-            self.subtitle_thread.wait()
+            self.subtitle_thread.cancel()
+            self.statusBar().showMessage("正在停止字幕生成，已完成的部分将在下次生成时继续")
         if self.progress_dialog:
             self.progress_dialog.close()
 
+    def on_subtitle_thread_cancelled(self):
+        if self.sender() is self.subtitle_thread and self.subtitle_thread_attached:
+            self.statusBar().showMessage("字幕生成已停止", 3000)
+
     def update_subtitle_progress(self, progress):
-        if self.progress_dialog:
+        if self.is_current_subtitle_thread() and self.subtitle_thread_attached and self.progress_dialog:
             self.progress_dialog.setValue(progress)
 
+    def is_current_subtitle_thread(self):
+        # 忽略已取消或已被新任务替换的线程发出的信号
+        return self.sender() is self.subtitle_thread and not self.subtitle_thread.isInterruptionRequested()
+
+    def on_subtitle_segments(self, segments):
+        if self.is_current_subtitle_thread() and self.subtitle_thread_attached:
+            self.append_subtitle_segments(segments)
+
+    def append_subtitle_segments(self, segments):
+        # 按片段编号去重，只追加尚未显示的片段
+        segments = [s for s in segments if s['id'] >= self.streamed_segment_count]
+        if not segments:
+            return
+        if self.streamed_segment_count == 0:
+            self.text_edit.clear()
+        srt = self.subtitle_thread.format_as_srt(segments, segments[0]['id'] + 1)
+        self.text_edit.append_plain_text(srt)
+        self.streamed_segment_count = segments[-1]['id'] + 1
+
     def on_subtitle_thread_finished(self, srt_path):
+        if not self.is_current_subtitle_thread():
+            return
+        if not self.subtitle_thread_attached:
+            # 预生成结果已写入缓存，点击生成字幕时直接加载
+            self.statusBar().showMessage("字幕已在后台生成完成", 5000)
+            return
         if self.progress_dialog:
             self.progress_dialog.close()
-        self.load_srt(srt_path)
+        # 字幕已逐段推送到编辑框时不再整体重载，以免覆盖用户已做的校正
+        if self.streamed_segment_count == 0:
+            self.load_srt(srt_path)
         self.video_player.play_video(self.video_path)
 
-    def insert_image(self, item):
-        list_widget = item.listWidget()
-        row = list_widget.row(item)
-        pixmap = self.pdf_images[row]
+    def on_subtitle_thread_error(self, message):
+        if not self.is_current_subtitle_thread():
+            return
+        if not self.subtitle_thread_attached:
+            self.statusBar().showMessage(f"后台预生成字幕失败: {message}", 5000)
+            return
+        if self.progress_dialog:
+            self.progress_dialog.close()
+        QMessageBox.warning(self, "字幕生成失败", message)
 
-        cursor = self.text_edit.textCursor()
-        image = pixmap.toImage()
-        byte_array = QByteArray()
-        buffer = QBuffer(byte_array)
-        buffer.open(QIODevice.WriteOnly)
-        image.save(buffer, "PNG")
-        base64_data = byte_array.toBase64().data()
+    def insert_image(self, page_number):
+        # 缩略图只用于显示，插入时取该页原始分辨率的 PNG(磁盘缓存中没有时再渲染)
+        data = self.pdf_list_widget.page_png(page_number)
+        if data is not None:
+            self.text_edit.insert_encoded_image(data)
 
-        cursor.insertImage(pixmap.toImage(), "data:image/png;base64,{}".format(str(base64_data, encoding='utf-8')))
-        self.text_edit.setTextCursor(cursor)
+    def save_project(self):
+        project_path, _ = QFileDialog.getSaveFileName(self, "保存项目", "", f"项目文件 (*{PROJECT_SUFFIX})")
+        if not project_path:
+            return
+        if not project_path.endswith(PROJECT_SUFFIX):
+            project_path += PROJECT_SUFFIX
+        project = Project(self.text_edit.toHtml(), getattr(self, 'video_path', ''), self.pdf_path,
+                          self.optimized_results, CueList.parse(self.text_edit.toPlainText()))
+        try:
+            save_project(project_path, project, self.text_edit.image_store)
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"保存项目失败:\n{e}")
+            return
+        self.statusBar().showMessage(f"项目已保存: {project_path}", 5000)
+
+    def open_project(self):
+        project_path, _ = QFileDialog.getOpenFileName(self, "打开项目", "", f"项目文件 (*{PROJECT_SUFFIX})")
+        if not project_path:
+            return
+        try:
+            project = load_project(project_path, self.text_edit.image_store)
+        except ProjectError as e:
+            QMessageBox.critical(self, "错误", str(e))
+            return
+        # 先显示文本，图片在滚动到可视区域时才从项目文件中读取
+        self.text_edit.setHtml(project.html)
+        self.clear_highlight()
+        self.optimized_results = project.optimized_results
+        if project.video_path and os.path.exists(project.video_path):
+            self.video_path = project.video_path
+            self.video_player.play_video(project.video_path)
+        if project.pdf_path and os.path.exists(project.pdf_path):
+            self.display_pdf(project.pdf_path)
 
     def load_srt(self, srt_path):
         with open(srt_path, "r", encoding="utf-8") as file:
             lines = file.readlines()
 
         self.text_edit.setText("".join(lines))
+        self.clear_highlight()
 
     def clear_highlight(self):
-        cursor = QTextCursor(self.text_edit.document())
-        cursor.select(QTextCursor.Document)
-        fmt = QTextCharFormat()
-        fmt.setBackground(QBrush(QColor("white")))
-        cursor.mergeCharFormat(fmt)
+        self.text_edit.set_extra_selection_group("playback", [])
+        self.last_highlighted_line = -1
 
     def highlight_text(self, line_number):
         if line_number == self.last_highlighted_line:
             return
-        self.clear_highlight()
-
-        fmt = QTextCharFormat()
-        fmt.setBackground(QBrush(QColor("yellow")))
-
-        cursor = QTextCursor(self.text_edit.document())
-        block = cursor.block()
-
-        for _ in range(line_number):
-            block = block.next()
 
-        cursor.setPosition(block.position())
-        cursor.select(QTextCursor.LineUnderCursor)
-        cursor.mergeCharFormat(fmt)
+        # 以覆盖层绘制当前字幕行，直接按块号定位，不改动文档格式
+        block = self.text_edit.document().findBlockByNumber(line_number)
+        if not block.isValid():
+            return
+        selection = QTextEdit.ExtraSelection()
+        selection.format.setBackground(QBrush(QColor("yellow")))
+        selection.cursor = QTextCursor(block)
+        selection.cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        self.text_edit.set_extra_selection_group("playback", [selection])
 
         self.last_highlighted_line = line_number
 
-    def update_subtitles(self):
-        current_time = self.video_player.player.get_time()
+    def update_playback_position(self, current_time, fraction):
+        self.update_slider(fraction)
         self.yellow_line(current_time)
 
     def yellow_line(self, current_time):
-        text = self.text_edit.toPlainText()
-        lines = text.split('\n')
-        for i, line in enumerate(lines):
-            if '-->' in line:
-                time_range = line
-                start_time, end_time = parse_srt_time_range(time_range)
-                if start_time <= current_time <= end_time:
-                    self.highlight_text(i + 1)  # 高亮时间所在行的下一行文本
-                    break
+        block_number = self.cue_index.find(current_time)
+        if block_number >= 0:
+            self.highlight_text(block_number + 1)  # 高亮时间所在行的下一行文本
 
     def load_pdf(self):
         pdf_path, _ = QFileDialog.getOpenFileName(self, "Open PDF", "", "PDF Files (*.pdf)")
@@ -349,26 +619,86 @@ class VideoPlayer(QMainWindow):
             self.display_pdf(pdf_path)
 
     def display_pdf(self, pdf_path):
-        doc = fitz.open(pdf_path)
-        self.pdf_images = []
-        self.pdf_list_widget.clear()
+        try:
+            self.pdf_list_widget.open_pdf(pdf_path)
+        except (RuntimeError, ValueError) as e:
+            QMessageBox.warning(self, "错误", f"无法打开PDF: {e}")
+            return
+        self.pdf_path = pdf_path
         self.pdf_list_widget.setVisible(True)
+        self.prerender_pdf_button.setEnabled(True)
 
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap()
-            img = QPixmap.fromImage(QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888))
-            self.pdf_images.append(img)
-
-            scaled_img = img.scaled(pix.width // 2, pix.height // 2, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-            item = QListWidgetItem()
-            item.setSizeHint(scaled_img.size())
-
-            label = QLabel()
-            label.setPixmap(scaled_img)
-            self.pdf_list_widget.addItem(item)
-            self.pdf_list_widget.setItemWidget(item, label)
+    def prerender_pdf(self):
+        dpi, ok = QInputDialog.getInt(self, "预渲染全部页面", "插入幻灯片的分辨率 (DPI):",
+                                      self.pdf_list_widget.insert_dpi, 36, 600)
+        if not ok:
+            return
+        thread = self.pdf_list_widget.prerender(dpi)
+        if thread is None:
+            return
+        self.prerender_pdf_button.setEnabled(False)
+        thread.progress.connect(
+            lambda done, total: self.statusBar().showMessage(f"正在预渲染PDF页面: {done}/{total}"))
+        thread.finished.connect(lambda: self.prerender_pdf_button.setEnabled(True))
+        thread.finished.connect(lambda: self.statusBar().showMessage("PDF页面预渲染完成", 3000))
+        thread.start(QThread.LowPriority)
+
+    def auto_insert_slides(self):
+        if not getattr(self, 'video_path', '') or not self.pdf_path:
+            QMessageBox.warning(self, "提示", "请先加载视频和对应的PDF文档。")
+            return
+        if not len(self.cue_index):
+            QMessageBox.warning(self, "提示", "编辑框中没有字幕，请先生成或加载字幕。")
+            return
+        if self.align_thread is not None and self.align_thread.isRunning():
+            return
+        sample_fps, ok = QInputDialog.getDouble(self, "自动插入幻灯片", "每秒采样帧数:", DEFAULT_SAMPLE_FPS, 0.05, 5, 2)
+        if not ok:
+            return
+        modes = ["按采样频率解码(准确)", "仅解码关键帧(快速，切换时刻可能延后数秒，采样频率只是上限)"]
+        mode, ok = QInputDialog.getItem(self, "自动插入幻灯片", "抽帧方式:", modes, 0, False)
+        if not ok:
+            return
+        self.align_slides_button.setEnabled(False)
+        self.align_thread = SlideAlignThread(self.video_path, self.pdf_path, sample_fps,
+                                             keyframes_only=mode == modes[1],
+                                             page_cache=self.pdf_list_widget.page_model.page_cache,
+                                             dpi=self.pdf_list_widget.insert_dpi, parent=self)
+        self.align_thread.progress_signal.connect(
+            lambda percent: self.statusBar().showMessage(f"正在匹配视频画面与PDF页面: {percent}%"))
+        self.align_thread.finished_signal.connect(self.insert_slides)
+        self.align_thread.error_signal.connect(lambda message: QMessageBox.warning(self, "自动插入失败", message))
+        self.align_thread.finished.connect(lambda: self.align_slides_button.setEnabled(True))
+        self.align_thread.start()
+
+    def insert_slides(self, changes, pngs):
+        # changes 为 (出现时刻毫秒, 页码)，插入到切换后第一条字幕的序号行之前；
+        # pngs 为对齐线程中已取出的各页 PNG，这里只做文档插入
+        document = self.text_edit.document()
+        targets = []
+        for time_ms, page_number in changes:
+            block_number = self.cue_index.find_next(max(0, time_ms - CUE_SNAP_MS))
+            if block_number < 0:
+                continue
+            block = document.findBlockByNumber(block_number)
+            if block.previous().isValid() and block.previous().text().strip().isdigit():
+                block = block.previous()
+            targets.append((block.position(), page_number))
+
+        # 从后往前插入，前面的位置不受影响；整体作为一次编辑，可一步撤销
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        inserted = 0
+        for position, page_number in sorted(targets, reverse=True):
+            data = pngs.get(page_number)
+            if data is None:
+                continue
+            cursor.setPosition(position)
+            if self.text_edit.insert_encoded_image(data, cursor):
+                cursor.insertBlock()
+                inserted += 1
+        cursor.endEditBlock()
+        self.statusBar().showMessage(f"已自动插入 {inserted} 页幻灯片", 5000)
 
     def mouseMoveEvent(self, event):
         cursor = self.text_edit.cursorForPosition(event.pos())
@@ -376,77 +706,71 @@ class VideoPlayer(QMainWindow):
         self.update_repeat_button(line_number)
 
     def update_repeat_button(self, line_number):
-        text = self.text_edit.toPlainText()
-        lines = text.split('\n')
-
-        # 检查当前行、上一行和下一行是否包含 '-->'
-        if line_number < len(lines):
-            if '-->' in lines[line_number]:  # 检查当前行
-                self.current_line_number = line_number  # 设置当前行号
-            elif line_number > 0 and '-->' in lines[line_number - 1]:  # 检查上一行
-                self.current_line_number = line_number - 1  # 设置当前行号为上一行
-            elif line_number < len(lines) - 1 and '-->' in lines[line_number + 1]:  # 检查下一行
-                self.current_line_number = line_number + 1  # 设置当前行号为下一行
-            else:
-                self.repeat_button.setVisible(False)  # 如果不包含 '-->'，隐藏按钮
-                return  # 直接返回，避免后续代码执行
-
-            self.repeat_button.setVisible(True)  # 显示复读按钮
-
-            # 创建一个新的光标，不改变当前光标位置
-            cursor = QTextCursor(self.text_edit.document())
-            cursor.movePosition(cursor.Start)  # 移动到文档开始
-            for _ in range(self.current_line_number):
-                cursor.movePosition(cursor.NextBlock)  # 移动到目标行
-            cursor.movePosition(cursor.EndOfBlock)  # 移动到当前行的行尾
-            rect_current = self.text_edit.cursorRect(cursor)  # 当前行的矩形区域
-            
-            # 获取下一行的矩形区域
-            if self.current_line_number < len(lines) - 1:
-                cursor.movePosition(cursor.NextBlock)  # 移动到下一行
-                cursor.movePosition(cursor.EndOfBlock)  # 移动到当前行的行尾
-                rect_next = self.text_edit.cursorRect(cursor)  # 下一行的矩形区域
-            else:
-                rect_next = QRect()  # 如果没有下一行，设置为空矩形
-            
-            # 计算最大宽度
-            max_x = max(rect_current.right(), rect_next.right()) + 5
-            # 移动按钮到最大宽度的右侧
-            self.repeat_button.move(self.text_edit.mapToGlobal(QPoint(max_x, rect_current.top() )))
-            self.repeat_button.setFixedWidth(100)  # 设置按钮宽度为100
+        # 检查当前行、上一行和下一行是否为字幕时间行
+        for candidate in (line_number, line_number - 1, line_number + 1):
+            if candidate >= 0 and self.cue_index.cue_at_block(candidate) is not None:
+                self.current_line_number = candidate  # 设置当前行号
+                break
+        else:
+            self.repeat_button.setVisible(False)  # 附近没有时间行，隐藏按钮
+            return
+
+        self.repeat_button.setVisible(True)  # 显示复读按钮
+
+        # 直接按块号定位，不改变当前光标位置
+        block = self.text_edit.document().findBlockByNumber(self.current_line_number)
+        cursor = QTextCursor(block)
+        cursor.movePosition(QTextCursor.EndOfBlock)  # 移动到当前行的行尾
+        rect_current = self.text_edit.cursorRect(cursor)  # 当前行的矩形区域
+
+        # 获取下一行的矩形区域
+        next_block = block.next()
+        if next_block.isValid():
+            cursor = QTextCursor(next_block)
+            cursor.movePosition(QTextCursor.EndOfBlock)  # 移动到下一行的行尾
+            rect_next = self.text_edit.cursorRect(cursor)  # 下一行的矩形区域
         else:
-            self.repeat_button.setVisible(False)  # 行号超出范围，隐藏按钮
+            rect_next = QRect()  # 如果没有下一行，设置为空矩形
+
+        # 计算最大宽度
+        max_x = max(rect_current.right(), rect_next.right()) + 5
+        # 移动按钮到最大宽度的右侧
+        self.repeat_button.move(self.text_edit.mapToGlobal(QPoint(max_x, rect_current.top() )))
+        self.repeat_button.setFixedWidth(100)  # 设置按钮宽度为100
 
     def repeat_current_line(self):
-        text = self.text_edit.toPlainText()
-        lines = text.split('\n')
-        if self.current_line_number < len(lines):
-            time_range = lines[self.current_line_number]
-            start_time, end_time = parse_srt_time_range(time_range)
-            self.video_player.set_playback_milliseconds_position(start_time + 1)  # 设置播放位置为起始时间
-            
-            # 禁用复读按钮
+        cue = self.cue_index.cue_at_block(self.current_line_number)
+        if cue is not None:
+            start_time, end_time = cue
+            # 禁用复读按钮，播放到字幕结束时间时播放器自动暂停并发出 segment_finished
             self.repeat_button.setEnabled(False)
-            
-            # 播放完成后暂停并重新启用按钮
-            QTimer.singleShot((end_time - start_time), self.on_playback_finished)  # 播放完成后调用回调
+            self.video_player.play_segment(start_time + 1, end_time)
 
     def on_playback_finished(self):
-        self.video_player.player.pause()  # 暂停视频播放
         self.repeat_button.setEnabled(True)  # 重新启用复读按钮
 
+    def closeEvent(self, event):
+        # 正常退出时清理自动保存
+        self.autosave.stop()
+        self.autosave.discard()
+        if self.align_thread is not None and self.align_thread.isRunning():
+            self.align_thread.requestInterruption()
+            self.align_thread.wait()
+        # 字幕线程以窗口为父对象，仍在运行时随窗口销毁会直接终止程序；
+        # 已被替换但仍在收尾的旧线程同样需要等待
+        for subtitle_thread in self.findChildren(SubtitleThread):
+            if subtitle_thread.isRunning():
+                subtitle_thread.cancel()
+                subtitle_thread.wait()
+        self.pdf_list_widget.close_pdf()
+        super().closeEvent(event)
+
     def on_api_provider_changed(self, provider):
         self.load_api_key(provider)
 
     def load_api_key(self, provider):
-        if provider == "OpenAI":
-            api_key = os.getenv("OPENAI_API_KEY", "")
-        elif provider == "Groq":
-            api_key = os.getenv("GROQ_API_KEY", "")
-        elif provider == "Claude":
-            api_key = os.getenv("ANTHROPIC_API_KEY", "")
-        else:
-            api_key = ""
+        env_var = API_KEY_ENV_VARS.get(provider)
+        api_key = os.getenv(env_var, "") if env_var else ""
 
         self.api_key_input.setText(api_key)
 
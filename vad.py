@@ -0,0 +1,116 @@
+# vad.py
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio import SAMPLE_RATE, _allocate_buffer
+
+FRAME_MS = 30
+MIN_SPEECH_MS = 250  # 短于该时长的声音视为噪声
+MIN_SILENCE_MS = 800  # 短于该时长的停顿并入前后语音
+PAD_MS = 200  # 语音区两端保留的余量，避免切掉词首词尾
+ENERGY_MARGIN_DB = 12.0  # 高于本底噪声多少分贝视为有声
+MIN_ENERGY_DB = -55.0
+MAX_FLATNESS = 0.45  # 频谱平坦度高于该值的帧接近白噪声(掌声、风声等)
+GAP_SECONDS = 0.3  # 拼接语音区时插入的静音，让模型感知停顿
+BLOCK_FRAMES = 8192  # 分批计算能量和频谱，临时数组只与块大小有关，与音频时长无关
+
+
+def _frame_features(audio: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    num_frames = len(audio) // frame
+    energy_db = np.empty(num_frames, dtype=np.float32)
+    flatness = np.empty(num_frames, dtype=np.float32)
+    for start in range(0, num_frames, BLOCK_FRAMES):
+        end = min(start + BLOCK_FRAMES, num_frames)
+        # 每块只复制一小段为 float32，内存映射的长音频也不会整体读入
+        frames = np.asarray(audio[start * frame:end * frame], dtype=np.float32).reshape(end - start, frame)
+        energy_db[start:end] = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame + 1e-10)
+        power = np.abs(np.fft.rfft(frames, axis=1)) ** 2 + 1e-10
+        flatness[start:end] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db, flatness
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # 返回布尔序列中连续 True 区间的起止下标
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    # 基于能量与频谱平坦度的语音检测，返回原始音频中语音区的 (起始采样点, 结束采样点)
+    frame = int(sample_rate * FRAME_MS / 1000)
+    if len(audio) < frame:
+        return [(0, len(audio))]
+    energy_db, flatness = _frame_features(audio, frame)
+
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + ENERGY_MARGIN_DB, MIN_ENERGY_DB)
+    speech = (energy_db > threshold) & (flatness < MAX_FLATNESS)
+
+    # 填补短停顿
+    starts, ends = _runs(~speech)
+    max_gap = MIN_SILENCE_MS // FRAME_MS
+    for start, end in zip(starts, ends):
+        if 0 < start and end < len(speech) and end - start < max_gap:
+            speech[start:end] = True
+
+    # 去掉过短的声音，并在两端补余量
+    starts, ends = _runs(speech)
+    keep = ends - starts >= MIN_SPEECH_MS // FRAME_MS
+    pad = int(sample_rate * PAD_MS / 1000)
+    regions: List[Tuple[int, int]] = []
+    for start, end in zip(starts[keep] * frame - pad, ends[keep] * frame + pad):
+        start, end = max(0, int(start)), min(len(audio), int(end))
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+class SpeechTimeline:
+    # 把语音区拼接成紧凑音频，并负责把紧凑音频上的时间映射回原始时间轴
+    def __init__(self, regions: List[Tuple[int, int]], sample_rate: int = SAMPLE_RATE):
+        self.regions = regions
+        self.sample_rate = sample_rate
+        gap = int(GAP_SECONDS * sample_rate)
+        self.compact_starts: List[int] = []
+        position = 0
+        for start, end in regions:
+            self.compact_starts.append(position)
+            position += end - start + gap
+        self.gap = gap
+        self.compact_length = max(0, position - gap)
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        # 一次分配输出(长音频使用内存映射)，逐段直接写入，不产生中间副本
+        compacted = _allocate_buffer(self.compact_length)
+        for (start, end), compact_start in zip(self.regions, self.compact_starts):
+            compact_end = compact_start + end - start
+            compacted[compact_start:compact_end] = audio[start:end]
+            compacted[compact_end:compact_end + self.gap] = 0.0
+        return compacted
+
+    def to_original(self, seconds: float) -> float:
+        sample = seconds * self.sample_rate
+        index = max(0, bisect_right(self.compact_starts, sample) - 1)
+        start, end = self.regions[index]
+        # 落在插入静音中的时间归到该语音区末尾
+        offset = min(sample - self.compact_starts[index], end - start)
+        return (start + offset) / self.sample_rate
+
+    def map_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [dict(segment, start=self.to_original(segment['start']), end=self.to_original(segment['end']))
+                for segment in segments]
+
+
+def build_timeline(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Optional[SpeechTimeline]:
+    # 没有检测到语音或几乎全是语音时返回 None，直接转写原始音频
+    regions = detect_speech(audio, sample_rate)
+    if not regions:
+        return None
+    speech = sum(end - start for start, end in regions)
+    if speech >= 0.95 * len(audio):
+        return None
+    return SpeechTimeline(regions, sample_rate)
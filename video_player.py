@@ -1,19 +1,117 @@
 # video_player.py
+# VLC 播放器封装：通过 VLC 的事件管理器上报播放进度和状态，取代定时轮询。
+# VLC 在自己的线程中回调，这里只做限频后发出 Qt 信号，由 Qt 排队送到界面线程
+import time
 import vlc
-from typing import Any
-from PyQt5.QtWidgets import QSlider
+from typing import Any, Optional
+from PyQt5.QtCore import QObject, pyqtSignal
 
-class VideoPlayer:
-    def __init__(self):
+POSITION_INTERVAL_MS = 100  # 进度信号的最小间隔，与原来的轮询频率一致
+SEEK_THRESHOLD_MS = 1000  # 时间跳变超过该值视为跳转，立即上报
+
+
+class VideoPlayer(QObject):
+    position_changed = pyqtSignal(int, float)  # 当前时间(毫秒), 播放进度(0-1)
+    state_changed = pyqtSignal(str)  # "playing" / "paused" / "stopped" / "ended"
+    segment_finished = pyqtSignal()
+    _segment_end_reached = pyqtSignal()
+
+    def __init__(self, parent: Any = None):
+        super().__init__(parent)
         self.instance: Any = vlc.Instance()
         self.player: Any = self.instance.media_player_new()
+        self.length = 0
+        self.segment_start = 0
+        self.segment_end: Optional[int] = None
+        self._segment_armed = False  # 跳转生效、收到起点之后的时间后才开始检查终点
+        self._seek_from = 0  # 片段跳转前的播放时间，用于识别跳转生效前的旧事件
+        self._last_emit = 0.0
+        self._last_time = -1
+        self._latest_time = 0
+        # 回调中不能调用同一播放器的 libvlc 函数，到达片段终点后回到界面线程再暂停
+        self._segment_end_reached.connect(self._finish_segment)
+
+        events = self.player.event_manager()
+        self._callbacks = {
+            vlc.EventType.MediaPlayerTimeChanged: self._on_time_changed,
+            vlc.EventType.MediaPlayerLengthChanged: self._on_length_changed,
+            vlc.EventType.MediaPlayerPlaying: lambda event: self.state_changed.emit("playing"),
+            vlc.EventType.MediaPlayerPaused: self._on_paused,
+            vlc.EventType.MediaPlayerStopped: lambda event: self.state_changed.emit("stopped"),
+            vlc.EventType.MediaPlayerEndReached: self._on_end_reached,
+        }
+        for event_type, callback in self._callbacks.items():
+            events.event_attach(event_type, callback)
+
+    # ---- VLC 线程中的回调 ----
+
+    def _on_length_changed(self, event: Any) -> None:
+        self.length = event.u.new_length
+
+    def _emit_position(self, milliseconds: int) -> None:
+        self._last_emit = time.monotonic()
+        self._last_time = milliseconds
+        self.position_changed.emit(milliseconds, milliseconds / self.length if self.length > 0 else 0.0)
+
+    def _on_time_changed(self, event: Any) -> None:
+        milliseconds = event.u.new_time
+        self._latest_time = milliseconds
+        if self.segment_end is not None:
+            if not self._segment_armed:
+                # VLC 每隔几百毫秒才上报一次，短字幕可能直接越过终点，因此到达起点之后即开始检查；
+                # 紧接着跳转前位置继续上报的时间是跳转生效前的旧事件，不算到达
+                stale = (0 <= milliseconds - self._seek_from < SEEK_THRESHOLD_MS
+                         and not self.segment_start <= self._seek_from < self.segment_end)
+                self._segment_armed = milliseconds >= self.segment_start and not stale
+            if self._segment_armed and milliseconds >= self.segment_end:
+                self.segment_end = None
+                self._segment_end_reached.emit()
+        jumped = abs(milliseconds - self._last_time) >= SEEK_THRESHOLD_MS
+        if jumped or (time.monotonic() - self._last_emit) * 1000 >= POSITION_INTERVAL_MS:
+            self._emit_position(milliseconds)
+
+    def _on_paused(self, event: Any) -> None:
+        # 限频可能丢掉暂停前的最后一次进度，暂停时补发
+        if self._latest_time != self._last_time:
+            self._emit_position(self._latest_time)
+        self.state_changed.emit("paused")
+
+    def _on_end_reached(self, event: Any) -> None:
+        if self.segment_end is not None:
+            self.segment_end = None
+            self._segment_end_reached.emit()
+        self.state_changed.emit("ended")
+
+    # ---- 界面线程 ----
+
+    def _finish_segment(self) -> None:
+        self.player.set_pause(1)
+        self.segment_finished.emit()
 
     def play_video(self, video_path: str) -> None:
         media = self.instance.media_new(video_path)
+        self.cancel_segment()
+        self.length = 0
+        self._last_time = -1
         self.player.set_media(media)
         self.player.play()
 
+    # 播放、暂停、停止按钮都会结束正在进行的片段播放，避免旧的终点在无关的位置暂停
+
+    def play(self) -> None:
+        self.cancel_segment()
+        self.player.play()
+
+    def pause(self) -> None:
+        self.cancel_segment()
+        self.player.pause()
+
+    def stop(self) -> None:
+        self.cancel_segment()
+        self.player.stop()
+
     def set_position(self, position: float) -> None:
+        self.cancel_segment()
         self.player.set_position(position / 1000.0)
 
     def set_playback_milliseconds_position(self, milliseconds: int) -> None:
@@ -23,9 +121,15 @@ class VideoPlayer:
         else:
             print("时间必须为非负值")
 
-    def update_slider(self, slider: QSlider, is_slider_being_dragged: bool = False) -> None:
-        if not is_slider_being_dragged:
-            max_value = slider.maximum()
-            current_position = self.player.get_position()
-            progress_value = int(current_position * max_value)
-            slider.setValue(progress_value)
\ No newline at end of file
+    def play_segment(self, start_ms: int, end_ms: int) -> None:
+        # 播放到媒体时间 end_ms 时暂停并发出 segment_finished，不受界面卡顿或缓冲影响
+        self.segment_start, self.segment_end = start_ms, end_ms
+        self._segment_armed = False
+        self._seek_from = self._latest_time
+        self.set_playback_milliseconds_position(start_ms)
+
+    def cancel_segment(self) -> None:
+        # 用户手动跳转时结束片段播放，不暂停
+        if self.segment_end is not None:
+            self.segment_end = None
+            self.segment_finished.emit()